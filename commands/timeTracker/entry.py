@@ -11,6 +11,10 @@ if lib_dir not in sys.path:
     sys.path.append(lib_dir)
 
 from timeTrackerUtils.time_tracker import TimeTracker
+from timeTrackerUtils.parameter_storage import ParameterStorage
+from timeTrackerUtils.write_behind import WriteBehindQueue
+from timeTrackerUtils.export_worker import ExportWorker
+from timeTrackerUtils.storage_backends import load_settings
 from timeTrackerUtils.ui.main_window import TimeTrackerWindow
 
 # Command identity information
@@ -49,6 +53,8 @@ def start():
 def stop():
     global _cmd
     try:
+        if _cmd:
+            _cmd.stop()
         if _cmd and _cmd.window:
             _cmd.window.palette.deleteMe()
     except:
@@ -73,6 +79,70 @@ class TimeTrackerCommandCreatedHandler(adsk.core.CommandCreatedEventHandler):
                     'Failed to create command:\n{}'.format(traceback.format_exc())
                 )
 
+class DocumentChangedHandler(adsk.core.DocumentEventHandler):
+    """Drops cached parameter state when a document is opened, activated or closed."""
+    def __init__(self):
+        super().__init__()
+
+    def notify(self, args):
+        try:
+            event_args = adsk.core.DocumentEventArgs.cast(args)
+            doc_key = ParameterStorage.get_key_for_document(event_args.document)
+            ParameterStorage.invalidate_parameter_index(doc_key or None)
+        except:
+            ParameterStorage.invalidate_parameter_index()
+
+class DocumentActivatedHandler(adsk.core.DocumentEventHandler):
+    """Picks up writes that were still held for a document save when Fusion last stopped."""
+    def __init__(self):
+        super().__init__()
+
+    def notify(self, args):
+        try:
+            ParameterStorage.recover_pending_writes()
+        except:
+            pass
+
+class DocumentFlushHandler(adsk.core.DocumentEventHandler):
+    """Writes queued data for a document before it is saved or closed."""
+    def __init__(self, closing=False):
+        super().__init__()
+        self.closing = closing
+
+    def notify(self, args):
+        try:
+            event_args = adsk.core.DocumentEventArgs.cast(args)
+            doc_key = ParameterStorage.get_key_for_document(event_args.document)
+            if self.closing and WriteBehindQueue.save_with_document:
+                # Closed without saving: writing now would be discarded with the document
+                WriteBehindQueue.release(doc_key or None)
+            else:
+                WriteBehindQueue.flush(doc_key or None)
+        except:
+            WriteBehindQueue.flush()
+
+class FlushWritesHandler(adsk.core.CustomEventHandler):
+    """Runs the write-behind flush on the main thread once writes have gone quiet."""
+    def __init__(self):
+        super().__init__()
+
+    def notify(self, args):
+        try:
+            WriteBehindQueue.flush()
+        except:
+            pass
+
+class ExportProgressHandler(adsk.core.CustomEventHandler):
+    """Delivers export progress from worker threads on the main thread."""
+    def __init__(self):
+        super().__init__()
+
+    def notify(self, args):
+        try:
+            ExportWorker.dispatch(adsk.core.CustomEventArgs.cast(args).additionalInfo)
+        except:
+            pass
+
 class FusionTimekeeperCommand:
     def __init__(self):
         self.app = adsk.core.Application.get()
@@ -80,6 +150,9 @@ class FusionTimekeeperCommand:
         self.time_tracker = TimeTracker()
         self.window = None
         self.handlers = []
+        self.app_event_handlers = []
+        self.flush_event = None
+        self.export_event = None
         self.cmd_def = None
 
     def start(self):
@@ -131,6 +204,67 @@ class FusionTimekeeperCommand:
                     self.ui.messageBox(f'Tab {TAB_ID} not found')
             else:
                 self.ui.messageBox(f'Workspace {WORKSPACE_ID} not found')
+            
+            # Keep the cached parameter index in step with the open documents
+            document_handler = DocumentChangedHandler()
+            for event in (self.app.documentOpened, self.app.documentActivated, self.app.documentClosed):
+                event.add(document_handler)
+                self.app_event_handlers.append((event, document_handler))
+            
+            # Queued writes are flushed when they go quiet, and before a document is saved or closed.
+            # In save-with-document mode they are only written before a save or close.
+            WriteBehindQueue.save_with_document = bool(load_settings().get('save_with_document', False))
+            if WriteBehindQueue.save_with_document:
+                recover_handler = DocumentActivatedHandler()
+                self.app.documentActivated.add(recover_handler)
+                self.app_event_handlers.append((self.app.documentActivated, recover_handler))
+            for event, closing in ((self.app.documentSaving, False), (self.app.documentClosing, True)):
+                flush_handler = DocumentFlushHandler(closing)
+                event.add(flush_handler)
+                self.app_event_handlers.append((event, flush_handler))
+            self.app.unregisterCustomEvent(WriteBehindQueue.FLUSH_EVENT_ID)
+            self.flush_event = self.app.registerCustomEvent(WriteBehindQueue.FLUSH_EVENT_ID)
+            flush_writes_handler = FlushWritesHandler()
+            self.flush_event.add(flush_writes_handler)
+            self.app_event_handlers.append((self.flush_event, flush_writes_handler))
+            WriteBehindQueue.enabled = True
+            
+            # Exports run on worker threads and report back through a custom event
+            self.app.unregisterCustomEvent(ExportWorker.EVENT_ID)
+            self.export_event = self.app.registerCustomEvent(ExportWorker.EVENT_ID)
+            export_progress_handler = ExportProgressHandler()
+            self.export_event.add(export_progress_handler)
+            self.app_event_handlers.append((self.export_event, export_progress_handler))
+            ExportWorker.enabled = True
+            if WriteBehindQueue.save_with_document:
+                ParameterStorage.recover_pending_writes()
         except:
             if self.ui:
-                self.ui.messageBox('Failed to start:\n{}'.format(traceback.format_exc())) 
\ No newline at end of file
+                self.ui.messageBox('Failed to start:\n{}'.format(traceback.format_exc()))
+
+    def stop(self):
+        # Write anything still queued, then go back to immediate writes.
+        # Writes held for a document save stay in their local copies instead.
+        if WriteBehindQueue.save_with_document:
+            WriteBehindQueue.release()
+        else:
+            WriteBehindQueue.flush()
+        # Sync session records appended since the last batched fsync
+        self.time_tracker.flush()
+        WriteBehindQueue.enabled = False
+        
+        # Unsubscribe from application events
+        for event, handler in self.app_event_handlers:
+            try:
+                event.remove(handler)
+            except:
+                pass
+        self.app_event_handlers = []
+        if self.flush_event:
+            self.app.unregisterCustomEvent(WriteBehindQueue.FLUSH_EVENT_ID)
+            self.flush_event = None
+        ExportWorker.enabled = False
+        if self.export_event:
+            self.app.unregisterCustomEvent(ExportWorker.EVENT_ID)
+            self.export_event = None
+        ParameterStorage.invalidate_parameter_index() 
\ No newline at end of file
@@ -4,7 +4,7 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFont, QIcon
 import os
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 class TimeTrackerWindow(QMainWindow):
     def __init__(self, time_tracker):
@@ -86,25 +86,28 @@ class TimeTrackerWindow(QMainWindow):
         self.history_table.setRowCount(len(sessions))
         
         for row, session in enumerate(sessions):
-            start_time = datetime.fromisoformat(session[1])
-            end_time = datetime.fromisoformat(session[2]) if session[2] else None
-            duration = timedelta(seconds=session[3]) if session[3] else None
+            start_time = session.start_datetime
+            end_time = session.end_datetime
+            duration = timedelta(seconds=session.duration) if session.duration else None
             
-            self.history_table.setItem(row, 0, QTableWidgetItem(start_time.strftime("%Y-%m-%d %H:%M:%S")))
+            self.history_table.setItem(row, 0, QTableWidgetItem(start_time.strftime("%Y-%m-%d %H:%M:%S") if start_time else ""))
             self.history_table.setItem(row, 1, QTableWidgetItem(end_time.strftime("%Y-%m-%d %H:%M:%S") if end_time else "In Progress"))
             self.history_table.setItem(row, 2, QTableWidgetItem(str(duration).split('.')[0] if duration else "In Progress"))
-            self.history_table.setItem(row, 3, QTableWidgetItem(session[4] or ""))
+            self.history_table.setItem(row, 3, QTableWidgetItem(session.notes or ""))
 
     def export_to_csv(self):
         file_path, _ = QFileDialog.getSaveFileName(
             self, "Export to CSV", "", "CSV Files (*.csv)"
         )
         if file_path:
-            try:
-                self.time_tracker.export_to_csv(file_path)
-                QMessageBox.information(self, "Success", "Data exported successfully!")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to export data: {str(e)}")
+            # The file is written in the background; export_finished reports the outcome
+            self.time_tracker.export_in_background(file_path, 'csv', notify=self.export_finished)
+
+    def export_finished(self, message):
+        if message.get('state') == 'done':
+            QMessageBox.information(self, "Success", f"Data exported successfully! ({message.get('rows')} sessions)")
+        elif message.get('state') == 'error':
+            QMessageBox.critical(self, "Error", f"Failed to export data: {message.get('message')}")
 
     def export_to_text(self):
         file_path, _ = QFileDialog.getSaveFileName(
@@ -117,16 +120,16 @@ class TimeTrackerWindow(QMainWindow):
                     f.write("Fusion Timekeeper Session History\n")
                     f.write("=" * 50 + "\n\n")
                     for session in sessions:
-                        start_time = datetime.fromisoformat(session[1])
-                        end_time = datetime.fromisoformat(session[2]) if session[2] else None
-                        duration = timedelta(seconds=session[3]) if session[3] else None
+                        start_time = session.start_datetime
+                        end_time = session.end_datetime
+                        duration = timedelta(seconds=session.duration) if session.duration else None
                         
-                        f.write(f"Session {session[0]}\n")
-                        f.write(f"Start Time: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                        f.write(f"Session {session.id}\n")
+                        f.write(f"Start Time: {start_time.strftime('%Y-%m-%d %H:%M:%S') if start_time else ''}\n")
                         f.write(f"End Time: {end_time.strftime('%Y-%m-%d %H:%M:%S') if end_time else 'In Progress'}\n")
                         f.write(f"Duration: {str(duration).split('.')[0] if duration else 'In Progress'}\n")
-                        if session[4]:
-                            f.write(f"Notes: {session[4]}\n")
+                        if session.notes:
+                            f.write(f"Notes: {session.notes}\n")
                         f.write("\n")
                 
                 QMessageBox.information(self, "Success", "Data exported successfully!")
@@ -0,0 +1,130 @@
+import adsk.core
+import itertools
+import json
+import threading
+import time
+import traceback
+import sys
+import os
+
+# Add the lib directory to path if needed
+current_dir = os.path.dirname(os.path.abspath(__file__))
+lib_dir = os.path.abspath(os.path.join(current_dir, '..'))
+if lib_dir not in sys.path:
+    sys.path.append(lib_dir)
+
+from fusionAddInUtils import log_info, log_debug, log_warning, log_error
+
+class ExportWorker:
+    """
+    Runs exports on worker threads so the UI thread only takes a snapshot of
+    the data. A task is a function of one argument, a progress(rows) callback,
+    that returns the number of rows it wrote. Progress and the outcome are
+    passed back by firing EVENT_ID with a JSON message
+        {"id": export id, "state": "progress" | "done" | "error", "rows": n, "message": ...}
+    whose handler calls dispatch() on Fusion's main thread, which hands the
+    message to the notify callback given to submit().
+    While the event is not registered (enabled is False), tasks run immediately
+    on the calling thread.
+    """
+
+    EVENT_ID = 'FusionTimekeeperExportProgress'
+    PROGRESS_INTERVAL = 0.25  # minimum seconds between progress messages
+
+    # Whether an export event handler is registered, see entry.py
+    enabled = False
+
+    # Export id -> notify callback; only used on the main thread
+    _listeners = {}
+    _ids = itertools.count(1)
+
+    @staticmethod
+    def submit(task, notify=None, name='export'):
+        """
+        Start task on a worker thread. Returns the export id used in its messages.
+        Called on the main thread, like everything here except _run.
+        """
+        export_id = next(ExportWorker._ids)
+        if not ExportWorker.enabled:
+            ExportWorker._log_outcome(ExportWorker._run(export_id, task, name, notify))
+            return export_id
+
+        if notify:
+            ExportWorker._listeners[export_id] = notify
+        worker = threading.Thread(
+            target=ExportWorker._run, args=(export_id, task, name, ExportWorker._fire_event),
+            name=f"FusionTimekeeper {name}", daemon=True
+        )
+        worker.start()
+        log_info(f"Started {name} {export_id} in the background")
+        return export_id
+
+    @staticmethod
+    def dispatch(message_text):
+        """Hand a message fired by a worker to its notify callback; runs on the main thread."""
+        try:
+            message = json.loads(message_text)
+            export_id = message.get('id')
+            if message.get('state') in ('done', 'error'):
+                ExportWorker._log_outcome(message)
+                notify = ExportWorker._listeners.pop(export_id, None)
+            else:
+                notify = ExportWorker._listeners.get(export_id)
+            if notify:
+                notify(message)
+        except Exception as e:
+            log_error(f"Failed to deliver export progress: {str(e)}")
+            log_debug(f"Traceback: {traceback.format_exc()}")
+
+    @staticmethod
+    def _log_outcome(message):
+        """Log how an export ended; Fusion's text window may only be written on the main thread."""
+        name = message.get('name', 'export')
+        if message.get('state') == 'done':
+            log_info(f"Finished {name} {message.get('id')} ({message.get('rows')} rows)")
+        else:
+            log_error(f"{name.capitalize()} {message.get('id')} failed: {message.get('message')}")
+            log_debug(f"Traceback: {message.get('traceback')}")
+
+    @staticmethod
+    def _run(export_id, task, name, notify):
+        """
+        Run task and pass progress and the outcome to notify; returns the final
+        message. On a worker thread this must not log or touch the Fusion API
+        other than through notify (fireCustomEvent).
+        """
+        last_report = [time.monotonic()]
+
+        def progress(rows):
+            now = time.monotonic()
+            if now - last_report[0] >= ExportWorker.PROGRESS_INTERVAL:
+                last_report[0] = now
+                ExportWorker._notify(notify, {'id': export_id, 'state': 'progress', 'rows': rows})
+
+        try:
+            rows = task(progress)
+            message = {'id': export_id, 'name': name, 'state': 'done', 'rows': rows}
+        except Exception as e:
+            message = {'id': export_id, 'name': name, 'state': 'error', 'message': str(e), 'traceback': traceback.format_exc()}
+        ExportWorker._notify(notify, message)
+        return message
+
+    @staticmethod
+    def _notify(notify, message):
+        if not notify:
+            return
+        try:
+            notify(message)
+        except Exception as e:
+            log_warning(f"Export progress callback failed: {str(e)}")
+
+    @staticmethod
+    def _fire_event(message):
+        # Runs on the worker thread; dispatch() happens in the event handler.
+        # A failure cannot be logged from here and only loses the message.
+        try:
+            app = adsk.core.Application.get()
+            if app:
+                app.fireCustomEvent(ExportWorker.EVENT_ID, json.dumps(message))
+        except Exception:
+            pass
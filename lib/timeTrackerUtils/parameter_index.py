@@ -0,0 +1,69 @@
+import bisect
+import re
+
+# Splits a parameter name into prefix and trailing number (Time12 -> Time, 12)
+_NUMBERED_NAME = re.compile(r'^(.*?)(\d+)$')
+
+class ParameterIndex:
+    """
+    Lookup tables over the user parameters of one design, built in a single pass.
+    Maps name -> parameter and prefix -> sorted parameter numbers, so repeated
+    lookups while handling a request are dictionary lookups instead of scans
+    over design.userParameters. Writes made through ParameterStorage keep the
+    index current with added() and removed().
+    """
+
+    def __init__(self, params):
+        self.params = params
+        self._by_name = {}
+        self._numbers = {}
+        for i in range(params.count):
+            param = params.item(i)
+            self._insert(param.name, param)
+
+    def _insert(self, name, param):
+        if name not in self._by_name:
+            match = _NUMBERED_NAME.match(name)
+            if match:
+                bisect.insort(self._numbers.setdefault(match.group(1), []), int(match.group(2)))
+        self._by_name[name] = param
+
+    @property
+    def count(self):
+        """Number of user parameters in the design."""
+        return len(self._by_name)
+
+    def names(self):
+        """All parameter names."""
+        return list(self._by_name)
+
+    def get(self, name):
+        """Return the parameter with the given name, or None."""
+        return self._by_name.get(name)
+
+    def sequence(self, prefix):
+        """
+        Return the parameters named prefix + number (e.g. Time1, Time2) as
+        (number, param) pairs sorted by number.
+        """
+        found = []
+        for number in self._numbers.get(prefix, []):
+            param = self._by_name.get(f"{prefix}{number}")
+            if param is not None and (not found or found[-1][0] != number):
+                found.append((number, param))
+        return found
+
+    def added(self, name, param):
+        """Record a parameter created by our own write."""
+        self._insert(name, param)
+
+    def removed(self, name):
+        """Record a parameter deleted by our own write."""
+        if self._by_name.pop(name, None) is None:
+            return
+        match = _NUMBERED_NAME.match(name)
+        if match:
+            numbers = self._numbers.get(match.group(1), [])
+            position = bisect.bisect_left(numbers, int(match.group(2)))
+            if position < len(numbers) and numbers[position] == int(match.group(2)):
+                del numbers[position]
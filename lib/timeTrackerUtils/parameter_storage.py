@@ -2,6 +2,11 @@ import adsk.core
 import adsk.fusion
 import json
 import traceback
+import zlib
+import base64
+import hashlib
+from collections import OrderedDict
+from contextlib import contextmanager
 import datetime
 import sys
 import os
@@ -13,7 +18,11 @@ if lib_dir not in sys.path:
     sys.path.append(lib_dir)
 
 # Use absolute import
-from fusionAddInUtils import log_info, log_debug, log_warning, log_error, log_parameter_detail
+from fusionAddInUtils import log_info, log_debug, log_warning, log_error
+from .parameter_index import ParameterIndex
+from .write_behind import WriteBehindQueue
+from .session_codec import pack_sessions, unpack_sessions
+from .schema import SCHEMA_VERSION, schema_version, is_current, migrate_time_data
 
 class ParameterStorage:
     """
@@ -24,10 +33,57 @@ class ParameterStorage:
     # Parameter group and names
     PARAM_GROUP = 'FusionTimekeeper'
     TIME_DATA_PARAM = 'TimeData'
+    TIME_INDEX_PARAM = 'TimeDataIndex'  # lists the monthly shards (TimeData_2026_10, ...)
+    TIME_SUMMARY_PARAM = 'TimeSummary'  # totals of the time data, see get_time_summary()
+    TIME_DAYS_PREFIX = 'TimeDays'  # totals per day of one month of the summary (TimeDays_2026_10, ...)
+    SUMMARY_VERSION = 4  # summaries of another version are rebuilt
     NOTES_DATA_PARAM = 'NotesData'
     TIME_PREFIX = 'Time'
     NOTE_PREFIX = 'Note'
     
+    # Chunked storage for payloads that do not fit in a single parameter
+    MAX_PARAM_LENGTH = 2000  # Fusion has limits on string parameter length
+    CHUNK_SIZE = 1500
+    MANIFEST_SUFFIX = 'Manifest'
+    
+    # Payload codecs, marked by the first character of the stored text.
+    # Legacy payloads are plain JSON with escaped quotes and start with '{'.
+    CODEC_ZLIB_B85 = 'Z'  # zlib-compressed compact JSON, base85 encoded
+    CODEC_PACKED_SESSIONS = 'P'  # zlib-compressed columnar session records, see session_codec
+    
+    # Opt-in: store full session records in the packed columnar format.
+    # Times and durations are then kept to whole seconds.
+    PACKED_SESSIONS = False
+    
+    # Sequential TimeN parameters are only kept as backup for short histories
+    SEQUENTIAL_BACKUP_LIMIT = 100
+    
+    # Session records appended since the last TimeData snapshot (TimeJournal1, ...)
+    JOURNAL_PREFIX = 'TimeJournal'
+    JOURNAL_COMPACT_THRESHOLD = 50  # records before the journal is folded into the snapshot
+    
+    # Parameter index per document, see get_parameter_index()
+    _indexes = {}
+    
+    # Time entries last synced to sequential parameters, per document
+    _sequential_synced = {}
+    
+    # Decoded payloads per document (LRU): doc key -> {name: (content hash, data)}
+    DECODED_CACHE_SIZE = 8
+    _decoded_cache = OrderedDict()
+    decoded_cache_stats = {'hits': 0, 'misses': 0}
+    
+    # Added/updated/deleted/unchanged counts and API calls of the last sequential sync
+    last_sequential_sync = {}
+    
+    # Hash of the data last written or read per document: doc key -> {name: hash}.
+    # Stores of identical data are skipped, see _is_unchanged().
+    _stored_hashes = {}
+    write_stats = {'performed': 0, 'skipped': 0}
+    
+    # Time data generation per document, bumped whenever stored time data may have changed
+    _generations = {}
+    
     @staticmethod
     def get_active_document():
         """Get the active Fusion 360 document."""
@@ -65,271 +121,1322 @@ class ParameterStorage:
             return None
     
     @staticmethod
-    def store_time_data(data):
-        """Store time tracking data in document parameters."""
+    def get_parameter_index(design):
+        """
+        Return the ParameterIndex of a design, building it on first use.
+        The index is cached per document until invalidate_parameter_index() is
+        called, which happens when a document is opened or activated.
+        """
+        doc_key = ParameterStorage.get_document_key(design)
+        index = ParameterStorage._indexes.get(doc_key)
+        if index is None:
+            index = ParameterIndex(design.userParameters)
+            log_debug(f"Built parameter index with {index.count} parameters")
+            if doc_key:
+                ParameterStorage._indexes[doc_key] = index
+        return index
+    
+    @staticmethod
+    def invalidate_parameter_index(doc_key=None):
+        """Drop cached parameter state for one document, or for all documents."""
+        if doc_key is None:
+            ParameterStorage._indexes.clear()
+            ParameterStorage._sequential_synced.clear()
+            ParameterStorage._stored_hashes.clear()
+            for key in ParameterStorage._generations:
+                ParameterStorage._generations[key] += 1
+        else:
+            ParameterStorage._indexes.pop(doc_key, None)
+            ParameterStorage._sequential_synced.pop(doc_key, None)
+            ParameterStorage._stored_hashes.pop(doc_key, None)
+            ParameterStorage._bump_generation(doc_key)
+    
+    @staticmethod
+    def _bump_generation(doc_key):
+        ParameterStorage._generations[doc_key] = ParameterStorage._generations.get(doc_key, 0) + 1
+    
+    @staticmethod
+    def get_data_generation(design=None):
+        """
+        Return a token that changes whenever the stored time data of the design
+        (the active document by default) may have changed: a write or queued
+        write through ParameterStorage, or a document event. Comparing tokens
+        tells a reader whether its copy is still current without reading data.
+        """
+        if design is None:
+            design = ParameterStorage.get_active_document()
+        if not design:
+            return ('', 0)
+        doc_key = ParameterStorage.get_document_key(design)
+        return (doc_key, ParameterStorage._generations.get(doc_key, 0))
+    
+    @staticmethod
+    def has_time_data(design):
+        """Check whether the design holds any stored time data."""
+        index = ParameterStorage.get_parameter_index(design)
+        name = ParameterStorage.TIME_DATA_PARAM
+        return bool(
+            WriteBehindQueue.pending(ParameterStorage.get_document_key(design), name) is not None or
+            index.get(name) or
+            index.get(name + ParameterStorage.MANIFEST_SUFFIX) or
+            index.get(ParameterStorage.TIME_INDEX_PARAM) or
+            index.sequence(ParameterStorage.TIME_PREFIX) or
+            index.sequence(ParameterStorage.JOURNAL_PREFIX)
+        )
+    
+    @staticmethod
+    @contextmanager
+    def _deferred_compute(design):
+        """
+        Run a block of parameter changes as one bulk mutation: design compute is
+        deferred while the block runs and the previous setting is restored after,
+        so the design recomputes once instead of after every add, update or delete.
+        Nested blocks leave the setting to the outermost one.
+        """
+        previous = None
+        try:
+            previous = design.isComputeDeferred
+            if not previous:
+                design.isComputeDeferred = True
+        except Exception as e:
+            log_debug(f"Could not defer compute: {str(e)}")
+        try:
+            yield
+        finally:
+            if previous is False:
+                try:
+                    design.isComputeDeferred = False
+                except Exception as e:
+                    log_warning(f"Could not restore compute: {str(e)}")
+    
+    @staticmethod
+    def _add_param(index, name, value_input, unit, comment):
+        """Create a user parameter and record it in the index."""
+        param = index.params.add(name, value_input, unit, comment)
+        if param:
+            index.added(name, param)
+        return param
+    
+    @staticmethod
+    def _set_string_param(index, name, text):
+        """
+        Create or update a text parameter holding the given string.
+        The text is stored as-is, so it must not contain double quotes or
+        backslashes (encoded payloads and manifests never do).
+        """
+        expression = f'"{text}"'
+        param = index.get(name)
+        if param:
+            param.expression = expression
+            return param
+        return ParameterStorage._add_param(
+            index,
+            name,
+            adsk.core.ValueInput.createByString(expression),
+            '',  # unit type (empty for text)
+            ParameterStorage.PARAM_GROUP
+        )
+    
+    @staticmethod
+    def _get_string_param(index, name):
+        """Return the raw text stored in a text parameter, or None if it does not exist."""
+        param = index.get(name)
+        if not param:
+            return None
+        text = param.expression
+        # Remove surrounding quotes if present
+        if text.startswith('"') and text.endswith('"'):
+            text = text[1:-1]
+        return text
+    
+    @staticmethod
+    def _encode_payload(data):
+        """Encode data for storage as a codec header followed by escape-free text."""
+        if ParameterStorage.PACKED_SESSIONS:
+            packed = ParameterStorage._pack_time_data(data)
+            if packed is not None:
+                compressed = zlib.compress(packed, 9)
+                return ParameterStorage.CODEC_PACKED_SESSIONS + base64.b85encode(compressed).decode('ascii')
+        
+        json_data = json.dumps(data, separators=(',', ':'))
+        compressed = zlib.compress(json_data.encode('utf-8'), 9)
+        return ParameterStorage.CODEC_ZLIB_B85 + base64.b85encode(compressed).decode('ascii')
+    
+    @staticmethod
+    def _decode_payload(text):
+        """
+        Decode a stored payload, dispatching on its codec header.
+        Legacy JSON payloads with escaped quotes are decoded transparently.
+        Raises ValueError if the payload cannot be decoded.
+        """
+        if text[:1] == ParameterStorage.CODEC_ZLIB_B85:
+            try:
+                json_data = zlib.decompress(base64.b85decode(text[1:])).decode('utf-8')
+            except zlib.error as e:
+                raise ValueError(f"Corrupt compressed payload: {str(e)}")
+            return json.loads(json_data)
+        
+        if text[:1] == ParameterStorage.CODEC_PACKED_SESSIONS:
+            try:
+                packed = zlib.decompress(base64.b85decode(text[1:]))
+            except zlib.error as e:
+                raise ValueError(f"Corrupt compressed payload: {str(e)}")
+            # Only current full records can be packed
+            return {"timeTracker": {"version": SCHEMA_VERSION, "sessions": unpack_sessions(packed)}}
+        
+        # Legacy JSON - handle escaped quotes
+        return json.loads(text.replace('\\"', '"'))
+    
+    @staticmethod
+    def _pack_time_data(data):
+        """Pack time data that holds nothing but full session records, or return None."""
+        if not isinstance(data, dict) or list(data) != ['timeTracker'] or not is_current(data):
+            return None
+        tracker = data['timeTracker']
+        if set(tracker) != {'version', 'sessions'} or not tracker['sessions']:
+            return None
+        return pack_sessions(tracker['sessions'])
+    
+    @staticmethod
+    def _delete_param(index, name):
+        """Delete a parameter by name if it exists."""
+        param = index.get(name)
+        if param:
+            param.deleteMe()
+            index.removed(name)
+            return True
+        return False
+    
+    @staticmethod
+    def _chunk_name(name, index):
+        """Name of chunk parameter number index (1-based) of a blob."""
+        return f"{name}_{index}"
+    
+    @staticmethod
+    def _delete_chunks(index, name, first_chunk):
+        """Delete chunk parameters of a blob from first_chunk on."""
+        for number, param in index.sequence(f"{name}_"):
+            if number >= first_chunk:
+                ParameterStorage._delete_param(index, ParameterStorage._chunk_name(name, number))
+                log_debug(f"Deleted chunk parameter {ParameterStorage._chunk_name(name, number)}")
+    
+    @staticmethod
+    def _write_blob(index, name, payload):
+        """
+        Store a payload string under a parameter name.
+        Payloads up to MAX_PARAM_LENGTH go into a single parameter, larger ones are
+        split over chunk parameters (name_1, name_2, ...) described by a manifest
+        parameter (name + MANIFEST_SUFFIX) holding chunk count, length and checksum.
+        Returns the number of parameters the payload occupies.
+        """
+        manifest_name = name + ParameterStorage.MANIFEST_SUFFIX
+        
+        if len(payload) <= ParameterStorage.MAX_PARAM_LENGTH:
+            ParameterStorage._set_string_param(index, name, payload)
+            # Remove a chunked copy left over from when the data was larger
+            if ParameterStorage._delete_param(index, manifest_name):
+                ParameterStorage._delete_chunks(index, name, 1)
+            return 1
+        
+        size = ParameterStorage.CHUNK_SIZE
+        chunks = [payload[i:i + size] for i in range(0, len(payload), size)]
+        log_info(f"Storing {len(payload)} characters as {len(chunks)} chunks of {name}")
+        
+        for number, chunk in enumerate(chunks, start=1):
+            ParameterStorage._set_string_param(index, ParameterStorage._chunk_name(name, number), chunk)
+        ParameterStorage._delete_chunks(index, name, len(chunks) + 1)
+        
+        # The manifest (chunks:length:crc32) is written last so it never
+        # describes chunks that are not there yet
+        manifest = f"{len(chunks)}:{len(payload)}:{zlib.crc32(payload.encode('utf-8'))}"
+        ParameterStorage._set_string_param(index, manifest_name, manifest)
+        
+        # The single parameter would be stale now
+        ParameterStorage._delete_param(index, name)
+        return len(chunks) + 1
+    
+    @staticmethod
+    def _read_blob(index, name):
+        """
+        Read a payload string stored with _write_blob.
+        Returns None if nothing is stored, raises ValueError if the chunks do not
+        match their manifest.
+        """
+        manifest_text = ParameterStorage._get_string_param(index, name + ParameterStorage.MANIFEST_SUFFIX)
+        if manifest_text is None:
+            return ParameterStorage._get_string_param(index, name)
+        return ParameterStorage._join_chunks(index, name, manifest_text)
+    
+    @staticmethod
+    def _join_chunks(index, name, manifest_text):
+        """Rebuild a chunked payload and check it against its manifest."""
+        chunk_count, length, crc = (int(field) for field in manifest_text.split(':'))
+        chunks = []
+        for number in range(1, chunk_count + 1):
+            chunk = ParameterStorage._get_string_param(index, ParameterStorage._chunk_name(name, number))
+            if chunk is None:
+                raise ValueError(f"Missing chunk {number} of {chunk_count} for {name}")
+            chunks.append(chunk)
+        payload = ''.join(chunks)
+        
+        if len(payload) != length or zlib.crc32(payload.encode('utf-8')) != crc:
+            raise ValueError(f"Chunked data for {name} does not match its manifest")
+        log_debug(f"Rebuilt {name} from {chunk_count} chunks ({len(payload)} characters)")
+        return payload
+    
+    @staticmethod
+    def _read_decoded(design, name):
+        """
+        Read and decode a blob through the decoded-data cache.
+        Entries are keyed by document and a hash of the stored expression (the
+        manifest for chunked blobs), so unchanged data is served without
+        re-reading chunks or re-parsing. Returns None when nothing is stored and
+        raises ValueError when the stored data is damaged.
+        The returned object is shared with the cache and must not be modified.
+        """
+        index = ParameterStorage.get_parameter_index(design)
+        doc_key = ParameterStorage.get_document_key(design)
+        
+        manifest_text = ParameterStorage._get_string_param(index, name + ParameterStorage.MANIFEST_SUFFIX)
+        stored_text = manifest_text
+        if stored_text is None:
+            stored_text = ParameterStorage._get_string_param(index, name)
+            if stored_text is None:
+                return None
+        content_hash = hashlib.blake2b(stored_text.encode('utf-8'), digest_size=16).digest()
+        
+        cache = ParameterStorage._decoded_cache
+        entries = cache.get(doc_key)
+        if entries is not None:
+            cache.move_to_end(doc_key)
+            cached = entries.get(name)
+            if cached is not None and cached[0] == content_hash:
+                ParameterStorage.decoded_cache_stats['hits'] += 1
+                log_debug(f"Decoded-data cache hit for {name}")
+                return cached[1]
+        ParameterStorage.decoded_cache_stats['misses'] += 1
+        log_debug(f"Decoded-data cache miss for {name}")
+        
+        if manifest_text is not None:
+            payload = ParameterStorage._join_chunks(index, name, manifest_text)
+        else:
+            payload = stored_text
+        log_debug(f"Stored payload length: {len(payload)}")
+        data = ParameterStorage._decode_payload(payload)
+        
+        if doc_key:
+            if entries is None:
+                entries = cache[doc_key] = {}
+                while len(cache) > ParameterStorage.DECODED_CACHE_SIZE:
+                    cache.popitem(last=False)
+            entries[name] = (content_hash, data)
+        return data
+    
+    @staticmethod
+    def _copy_time_data(data):
+        """
+        Copy the containers of decoded time data, so callers can add or replace
+        sessions without touching the cached copy. Session records are shared.
+        """
+        copied = dict(data)
+        tracker = copied.get('timeTracker')
+        if isinstance(tracker, dict):
+            tracker = dict(tracker)
+            if isinstance(tracker.get('sessions'), list):
+                tracker['sessions'] = list(tracker['sessions'])
+            copied['timeTracker'] = tracker
+        return copied
+    
+    @staticmethod
+    def _data_hash(value):
+        """Hash of the compact JSON form of a value."""
+        json_data = json.dumps(value, separators=(',', ':'))
+        return hashlib.blake2b(json_data.encode('utf-8'), digest_size=16).digest()
+    
+    @staticmethod
+    def _remember_hash(design, name, value_hash):
+        """Record the hash of data known to be stored under name (None forgets it)."""
+        doc_key = ParameterStorage.get_document_key(design)
+        if not doc_key:
+            return
+        hashes = ParameterStorage._stored_hashes.setdefault(doc_key, {})
+        if value_hash is None:
+            hashes.pop(name, None)
+        else:
+            hashes[name] = value_hash
+    
+    @staticmethod
+    def _is_unchanged(design, name, value_hash):
+        """Whether data with this hash is what was last written or read under name."""
+        doc_key = ParameterStorage.get_document_key(design)
+        return bool(doc_key) and ParameterStorage._stored_hashes.get(doc_key, {}).get(name) == value_hash
+    
+    @staticmethod
+    def get_write_stats():
+        """Return the number of stores performed and skipped because the data was unchanged."""
+        return dict(ParameterStorage.write_stats)
+    
+    @staticmethod
+    def get_cache_stats():
+        """Return decoded-data cache hit/miss counters and the number of cached documents."""
+        stats = dict(ParameterStorage.decoded_cache_stats)
+        stats['documents'] = len(ParameterStorage._decoded_cache)
+        return stats
+    
+    @staticmethod
+    def store_time_data(data, design=None):
+        """Store time tracking data in document parameters (of the active document by default)."""
         try:
             log_info("\n=== PARAMETER STORAGE DEBUG ===")
             log_info("Attempting to store time data in parameters")
-            design = ParameterStorage.get_active_document()
+            if design is None:
+                design = ParameterStorage.get_active_document()
             if not design:
                 log_error("CRITICAL ERROR: Failed to get active document")
                 return False
+            
+            # This write supersedes any queued one
+            WriteBehindQueue.discard(ParameterStorage.get_document_key(design), ParameterStorage.TIME_DATA_PARAM)
+            data = ParameterStorage._current_time_data(data)
                 
-            # Convert data to JSON string
-            json_data = json.dumps(data)
-            log_debug(f"Time data JSON length: {len(json_data)}")
-            log_debug(f"First 100 chars: {json_data[:100]}")
-            
-            # Safety check - if the JSON data is too large, we should prioritize sequential storage
-            large_data = len(json_data) > 2000  # Fusion has limits on string parameter length
-            if large_data:
-                log_warning("Warning: Time data is large, may not fit in a single parameter")
-                log_info("Using sequential parameter storage as primary method")
-                
-                # For large data, try sequential storage first
-                success = False
+            index = ParameterStorage.get_parameter_index(design)
+            
+            # Nothing to do if this is exactly the data already stored (autosave while idle)
+            data_hash = ParameterStorage._data_hash(data)
+            name = ParameterStorage.TIME_DATA_PARAM
+            snapshot_exists = (
+                index.get(ParameterStorage.TIME_INDEX_PARAM) or
+                index.get(name) or
+                index.get(name + ParameterStorage.MANIFEST_SUFFIX)
+            )
+            if (snapshot_exists and not index.sequence(ParameterStorage.JOURNAL_PREFIX) and
+                    ParameterStorage._is_unchanged(design, name, data_hash)):
+                ParameterStorage.write_stats['skipped'] += 1
+                log_info("Time data unchanged, skipping parameter write")
+                log_info("=== END PARAMETER STORAGE DEBUG ===\n")
+                return True
+            ParameterStorage.write_stats['performed'] += 1
+            ParameterStorage._remember_hash(design, name, None)
+            ParameterStorage._bump_generation(ParameterStorage.get_document_key(design))
+            
+            # All parameter changes of this save form one bulk mutation
+            with ParameterStorage._deferred_compute(design):
+                shards = ParameterStorage._split_time_shards(data)
+            
+                try:
+                    if shards is not None:
+                        # Session history is stored per month, only changed months are rewritten
+                        param_count = ParameterStorage._write_time_shards(design, index, shards, schema_version(data))
+                    else:
+                        # Encode data for the parameter expression
+                        payload = ParameterStorage._encode_payload(data)
+                        log_debug(f"Time data payload length: {len(payload)}")
+                    
+                        # Large data is split into chunks instead of one parameter per entry
+                        if len(payload) > ParameterStorage.MAX_PARAM_LENGTH:
+                            log_info("Time data is large, using chunked parameter storage")
+                        param_count = ParameterStorage._write_blob(index, ParameterStorage.TIME_DATA_PARAM, payload)
+                        ParameterStorage._delete_time_shards(design, index)
+                    log_info(f"Time data written to {param_count} parameter(s)")
+                except Exception as write_error:
+                    log_error(f"Error writing {ParameterStorage.TIME_DATA_PARAM}: {str(write_error)}")
+                    log_debug(f"Write error traceback: {traceback.format_exc()}")
+                    ParameterStorage.invalidate_parameter_index(ParameterStorage.get_document_key(design))
+                    # Sequential parameters are the last resort
+                    log_warning("Falling back to sequential storage only")
+                    success = ParameterStorage.store_time_data_sequential(data, design=design)
+                    # The snapshot was not replaced and readers still replay the journal
+                    # over it, so the journal stays; the summary may no longer match
+                    # what they read and is rebuilt on its next use
+                    try:
+                        ParameterStorage._delete_blob(ParameterStorage.get_parameter_index(design), ParameterStorage.TIME_SUMMARY_PARAM)
+                    except Exception as summary_error:
+                        log_warning(f"Failed to delete time summary: {str(summary_error)}")
+                    return success
+            
+                # The snapshot now includes everything the journal held
+                ParameterStorage._clear_time_journal(index)
+                ParameterStorage._store_time_summary(design, index, ParameterStorage._summarize_time_data(data))
+            
+                # Short histories also keep the sequential parameters as backup; longer
+                # ones do not, so stale backup entries are removed instead
                 try:
                     log_info("\nStoring sequential parameters...")
-                    success = ParameterStorage.store_time_data_sequential(data)
+                    entry_count = len(ParameterStorage._sequential_time_entries(data))
+                    keep_backup = entry_count <= ParameterStorage.SEQUENTIAL_BACKUP_LIMIT
+                    backup = data if keep_backup else {"timeTracker": {"sessions": []}}
+                    success = ParameterStorage.store_time_data_sequential(backup, design=design)
                     if success:
-                        log_info("Sequential parameters created successfully")
-                        # Return early as we're using sequential params as primary storage
-                        log_info("=== END PARAMETER STORAGE DEBUG ===\n")
-                        return True
+                        log_info("Sequential parameters synced successfully")
                     else:
-                        log_warning("Failed to create sequential parameters")
+                        log_warning("Failed to sync sequential parameters")
                 except Exception as seq_e:
                     log_error(f"Sequential parameter error: {str(seq_e)}")
                     log_debug(f"Sequential parameter error traceback: {traceback.format_exc()}")
-                    
-                # If sequential failed, we'll still try the JSON method below
             
-            # Get parameters collection and check if parameter exists
-            log_info("\nChecking user parameters...")
-            params = design.userParameters
-            log_debug(f"Parameter count: {params.count}")
+            ParameterStorage._remember_hash(design, name, data_hash)
+            log_info("Time data stored successfully")
+            log_info("=== END PARAMETER STORAGE DEBUG ===\n")
+            return True
+        except Exception as e:
+            log_error(f"CRITICAL ERROR: Failed to store time data: {str(e)}")
+            log_debug(f"Traceback: {traceback.format_exc()}")
+            return False
+    
+    @staticmethod
+    def _current_time_data(data):
+        """Return time data in the current schema, migrating data written by older versions."""
+        if is_current(data):
+            return data
+        log_info(f"Migrating time data from schema {schema_version(data)} to {SCHEMA_VERSION}")
+        return migrate_time_data(data)
+    
+    @staticmethod
+    def _month_key(session):
+        """Shard key of a session: its month as YYYY_MM, or Undated."""
+        date = session.get('date') if isinstance(session, dict) else None
+        if isinstance(date, str) and len(date) >= 7 and date[4] == '-' and date[:4].isdigit() and date[5:7].isdigit():
+            return f"{date[:4]}_{date[5:7]}"
+        return 'Undated'
+    
+    @staticmethod
+    def _shard_name(key):
+        """Parameter name of the shard holding one month of sessions."""
+        return f"{ParameterStorage.TIME_DATA_PARAM}_{key}"
+    
+    @staticmethod
+    def _session_seconds(session):
+        """Tracked seconds in a session record."""
+        duration = session.get('duration') if isinstance(session, dict) else None
+        return duration if isinstance(duration, (int, float)) else 0
+    
+    @staticmethod
+    def _split_time_shards(data):
+        """
+        Group the sessions of time data by month, keeping their order within a
+        month. Returns None for data holding more than a session list, which is
+        then stored as a single TimeData blob.
+        """
+        if not isinstance(data, dict) or list(data) != ['timeTracker']:
+            return None
+        tracker = data['timeTracker']
+        if not isinstance(tracker, dict) or not set(tracker) <= {'version', 'sessions'} or not isinstance(tracker.get('sessions'), list):
+            return None
+        shards = {}
+        for session in tracker['sessions']:
+            shards.setdefault(ParameterStorage._month_key(session), []).append(session)
+        return shards
+    
+    @staticmethod
+    def _read_shard_index(design):
+        """Return the shard index entries by key, or None if time data is not sharded."""
+        shard_index = ParameterStorage._read_decoded(design, ParameterStorage.TIME_INDEX_PARAM)
+        if shard_index is None:
+            return None
+        return {entry['key']: entry for entry in shard_index.get('shards', [])}
+    
+    @staticmethod
+    def _delete_blob(index, name):
+        """Delete a payload stored with _write_blob, single or chunked."""
+        ParameterStorage._delete_param(index, name)
+        if ParameterStorage._delete_param(index, name + ParameterStorage.MANIFEST_SUFFIX):
+            ParameterStorage._delete_chunks(index, name, 1)
+    
+    @staticmethod
+    def _write_time_shards(design, index, shards, version=SCHEMA_VERSION):
+        """
+        Write monthly shards and the shard index. A shard is only rewritten when
+        the hash of its sessions differs from the one in the index, so a save
+        usually touches the current month and the index.
+        Returns the number of parameters written.
+        """
+        try:
+            previous = ParameterStorage._read_shard_index(design) or {}
+        except (KeyError, ValueError):
+            previous = {}
+        
+        entries = []
+        written = 0
+        for key in sorted(shards):
+            sessions = shards[key]
+            json_data = json.dumps(sessions, separators=(',', ':'))
+            shard_hash = hashlib.blake2b(json_data.encode('utf-8'), digest_size=16).hexdigest()
+            entries.append({
+                'key': key,
+                'hash': shard_hash,
+                'sessions': len(sessions),
+                'seconds': sum(ParameterStorage._session_seconds(session) for session in sessions)
+            })
+            
+            name = ParameterStorage._shard_name(key)
+            stored = index.get(name) or index.get(name + ParameterStorage.MANIFEST_SUFFIX)
+            if stored and previous.get(key, {}).get('hash') == shard_hash:
+                continue
+            # With the schema version a shard of current records can be packed
+            payload = ParameterStorage._encode_payload({"timeTracker": {"version": version, "sessions": sessions}})
+            written += ParameterStorage._write_blob(index, name, payload)
+            log_debug(f"Wrote shard {name} ({len(sessions)} sessions)")
+        
+        # Months that no longer have sessions
+        for key in previous:
+            if key not in shards:
+                ParameterStorage._delete_blob(index, ParameterStorage._shard_name(key))
+        
+        # The index is written after the shards it lists
+        payload = ParameterStorage._encode_payload({'version': 1, 'schema': version, 'shards': entries})
+        written += ParameterStorage._write_blob(index, ParameterStorage.TIME_INDEX_PARAM, payload)
+        
+        # A single TimeData blob from before sharding is superseded now
+        ParameterStorage._delete_blob(index, ParameterStorage.TIME_DATA_PARAM)
+        log_info(f"Stored {len(entries)} monthly shard(s), {written} parameter(s) written")
+        return written
+    
+    @staticmethod
+    def _delete_time_shards(design, index):
+        """Delete the shard index and all shards it lists."""
+        try:
+            previous = ParameterStorage._read_shard_index(design) or {}
+        except (KeyError, ValueError):
+            previous = {}
+        for key in previous:
+            ParameterStorage._delete_blob(index, ParameterStorage._shard_name(key))
+        ParameterStorage._delete_blob(index, ParameterStorage.TIME_INDEX_PARAM)
+    
+    @staticmethod
+    def _read_time_snapshot(design, keys=None):
+        """
+        Read the stored time data snapshot: the monthly shards listed in the shard
+        index (only those in keys, if given), or the single TimeData blob.
+        Returns None if neither exists; raises ValueError if a shard is missing
+        or damaged. Session records are shared with the decoded-data cache.
+        """
+        shard_index = ParameterStorage._read_decoded(design, ParameterStorage.TIME_INDEX_PARAM)
+        if shard_index is None:
+            return ParameterStorage._read_decoded(design, ParameterStorage.TIME_DATA_PARAM)
+        
+        sessions = []
+        for entry in sorted(shard_index.get('shards', []), key=lambda entry: entry['key']):
+            key = entry['key']
+            if keys is not None and key not in keys:
+                continue
+            shard = ParameterStorage._read_decoded(design, ParameterStorage._shard_name(key))
+            if shard is None:
+                raise ValueError(f"Missing time data shard {key}")
+            sessions.extend(shard['timeTracker']['sessions'])
+        # The schema version of the data is the one kept in the index
+        tracker = {"sessions": sessions}
+        if 'schema' in shard_index:
+            tracker['version'] = shard_index['schema']
+        return {"timeTracker": tracker}
+    
+    @staticmethod
+    def get_time_data_summary(design=None):
+        """
+        Return the shard index as a list of {key, sessions, seconds} per month,
+        without reading any session data. Empty if time data is not sharded.
+        """
+        try:
+            if design is None:
+                design = ParameterStorage.get_active_document()
+            if not design:
+                return []
+            shard_index = ParameterStorage._read_shard_index(design) or {}
+            return [
+                {'key': key, 'sessions': entry['sessions'], 'seconds': entry['seconds']}
+                for key, entry in sorted(shard_index.items())
+            ]
+        except Exception as e:
+            log_error(f"Failed to read time data summary: {str(e)}")
+            return []
+    
+    @staticmethod
+    def get_time_summary(design=None):
+        """
+        Return the totals of the stored time data without reading its sessions:
+            {"version": 4, "seconds": tracked seconds, "sessions": session count,
+             "first": first date, "last": last date (None without dated sessions),
+             "last_id": highest session id, "months": {"YYYY-MM": [seconds, sessions]},
+             "undated": [seconds, sessions] of sessions without a date}
+        The TimeSummary parameter is kept current by every store and journal
+        append; documents written before it existed, or with an older summary
+        version, get it on first use. Totals per day are kept per month, see
+        get_time_summary_days().
+        """
+        try:
+            if design is None:
+                design = ParameterStorage.get_active_document()
+            if not design:
+                return ParameterStorage._public_summary(ParameterStorage._summarize_time_data({}))
+            return ParameterStorage._public_summary(ParameterStorage._current_time_summary(design))
+        except Exception as e:
+            log_error(f"Failed to read time summary: {str(e)}")
+            log_debug(f"Traceback: {traceback.format_exc()}")
+            return ParameterStorage._public_summary(ParameterStorage._summarize_time_data({}))
+    
+    @staticmethod
+    def get_time_summary_days(months=None, design=None):
+        """
+        Return the totals per day {"YYYY-MM-DD": [seconds, sessions]} of the given
+        months ('YYYY-MM'), or of all months, reading one TimeDays parameter per month.
+        """
+        try:
+            if design is None:
+                design = ParameterStorage.get_active_document()
+            if not design:
+                return {}
+            summary = ParameterStorage._current_time_summary(design)
+            if months is None:
+                months = summary['months']
+            try:
+                ParameterStorage._load_summary_days(design, summary, [month for month in months if month in summary['months']])
+            except ValueError as missing:
+                log_warning(f"Rebuilding time summary: {str(missing)}")
+                summary = ParameterStorage._rebuild_time_summary(design)
+            days = {}
+            for month in sorted(months):
+                days.update(summary['days'].get(month, {}))
+            return days
+        except Exception as e:
+            log_error(f"Failed to read time summary days: {str(e)}")
+            log_debug(f"Traceback: {traceback.format_exc()}")
+            return {}
+    
+    @staticmethod
+    def _public_summary(summary):
+        """The summary without the day totals it holds in memory."""
+        return {key: value for key, value in summary.items() if key != 'days'}
+    
+    @staticmethod
+    def _current_time_summary(design):
+        """
+        The summary of the time data of a design: computed from a queued write,
+        read from the TimeSummary parameter, or rebuilt and stored if that is
+        missing or of an older version.
+        """
+        # A queued write is not stored yet, but its data is at hand
+        pending = WriteBehindQueue.pending(ParameterStorage.get_document_key(design), ParameterStorage.TIME_DATA_PARAM)
+        if pending is not None:
+            return ParameterStorage._summarize_time_data(pending[0])
+        
+        summary = ParameterStorage._read_time_summary(design)
+        if summary is not None:
+            return summary
+        return ParameterStorage._rebuild_time_summary(design)
+    
+    @staticmethod
+    def _rebuild_time_summary(design):
+        """Summarize the full time data and store the summary if there is time data."""
+        summary = ParameterStorage._summarize_time_data(ParameterStorage.retrieve_time_data(design))
+        if ParameterStorage.has_time_data(design):
+            log_info("Writing missing time summary")
+            ParameterStorage._store_time_summary(design, ParameterStorage.get_parameter_index(design), summary)
+        return summary
+    
+    @staticmethod
+    def _summary_days_name(month):
+        """Parameter name of the day totals of one month ('YYYY-MM')."""
+        return f"{ParameterStorage.TIME_DAYS_PREFIX}_{month.replace('-', '_')}"
+    
+    @staticmethod
+    def _read_time_summary(design):
+        """
+        Return a copy of the stored summary that can be changed without touching
+        the cached one, or None if there is none of the current version. Its
+        'days' start empty and are filled per month by _load_summary_days.
+        """
+        summary = ParameterStorage._read_decoded(design, ParameterStorage.TIME_SUMMARY_PARAM)
+        if not isinstance(summary, dict) or summary.get('version') != ParameterStorage.SUMMARY_VERSION:
+            return None
+        return dict(
+            summary,
+            months={month: list(totals) for month, totals in summary['months'].items()},
+            undated=list(summary['undated']),
+            days={}
+        )
+    
+    @staticmethod
+    def _load_summary_days(design, summary, months):
+        """
+        Read the day totals of months into summary['days'] ({month: {day: totals}}),
+        skipping months already there. Raises ValueError if one is missing.
+        """
+        for month in months:
+            if month in summary['days']:
+                continue
+            days = ParameterStorage._read_decoded(design, ParameterStorage._summary_days_name(month))
+            if not isinstance(days, dict):
+                raise ValueError(f"Missing day totals for {month}")
+            summary['days'][month] = {day: list(totals) for day, totals in days.items()}
+    
+    @staticmethod
+    def _summarize_time_data(data):
+        """
+        Build the summary of time data (see get_time_summary) from its sessions,
+        with the day totals of every month in 'days'.
+        """
+        summary = {
+            'version': ParameterStorage.SUMMARY_VERSION, 'seconds': 0, 'sessions': 0,
+            'first': None, 'last': None, 'last_id': 0, 'months': {}, 'undated': [0, 0], 'days': {}
+        }
+        tracker = data.get('timeTracker', {}) if isinstance(data, dict) else {}
+        for session in tracker.get('sessions', []):
+            if isinstance(session, dict):
+                ParameterStorage._apply_to_summary(summary, None, session)
+        return summary
+    
+    @staticmethod
+    def _apply_to_summary(summary, previous, session):
+        """
+        Update a summary in place for a session record replacing previous (None
+        for a new session). The day totals of the months of both records, and of
+        the first and last month, must be in summary['days'].
+        """
+        for record, sign in ((previous, -1), (session, 1)):
+            if record is None:
+                continue
+            seconds = ParameterStorage._session_seconds(record)
+            summary['seconds'] += sign * seconds
+            summary['sessions'] += sign
+            if ParameterStorage._month_key(record) == 'Undated':
+                # e.g. 'Unknown' for times recovered from the sequential parameters
+                summary['undated'][0] += sign * seconds
+                summary['undated'][1] += sign
+                continue
+            date = record['date'][:10]
+            days = summary['days'].setdefault(date[:7], {})
+            for group, key in ((summary['months'], date[:7]), (days, date)):
+                totals = group.setdefault(key, [0, 0])
+                totals[0] += sign * seconds
+                totals[1] += sign
+                if totals[1] <= 0:
+                    del group[key]
+        
+        if isinstance(session.get('id'), int):
+            summary['last_id'] = max(summary['last_id'], session['id'])
+        months = summary['months']
+        summary['first'] = min(summary['days'][min(months)]) if months else None
+        summary['last'] = max(summary['days'][max(months)]) if months else None
+    
+    @staticmethod
+    def _find_time_session(design, index, session_id, month_key):
+        """
+        Find the stored session with an id among the journal records and the
+        shard of one month. Returns None if it is not there.
+        """
+        for record in reversed(ParameterStorage._journal_records(index)):
+            if record.get('id') == session_id:
+                return record
+        if index.get(ParameterStorage.TIME_INDEX_PARAM) is None:
+            return None
+        snapshot = ParameterStorage._read_time_snapshot(design, {month_key})
+        for record in snapshot['timeTracker']['sessions']:
+            if record.get('id') == session_id:
+                return record
+        return None
+    
+    @staticmethod
+    def _updated_time_summary(design, index, session):
+        """
+        The stored summary updated for one appended session record, reading at
+        most the journal, one monthly shard and the day totals of a few months.
+        Returns None when the summary has to be rebuilt from the full data instead.
+        """
+        try:
+            summary = ParameterStorage._read_time_summary(design)
+            if summary is None:
+                return None
+            
+            # Ids are handed out in increasing order, so a higher one is a new session
+            previous = None
+            session_id = session.get('id')
+            if session_id is not None and not (isinstance(session_id, int) and session_id > summary['last_id']):
+                previous = ParameterStorage._find_time_session(design, index, session_id, ParameterStorage._month_key(session))
+                if previous is None:
+                    return None
             
-            # Clean up the JSON string to create a valid parameter expression
-            # First, ensure all double quotes are properly escaped for the parameter expression
-            param_expression = json_data.replace('"', '\\"')
+            # Removing the only session of the first or last month moves that
+            # bound to the neighbouring month
+            months = sorted(summary['months'])
+            months = set(months[:2] + months[-2:])
+            for record in (previous, session):
+                if record is not None and ParameterStorage._month_key(record) != 'Undated':
+                    months.add(record['date'][:7])
+            ParameterStorage._load_summary_days(design, summary, [month for month in months if month in summary['months']])
+            ParameterStorage._apply_to_summary(summary, previous, session)
+            return summary
+        except Exception as e:
+            log_warning(f"Could not update time summary: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _store_time_summary(design, index, summary):
+        """
+        Write the day totals of the months in summary['days'] that changed, then
+        the summary parameter unless it already holds this summary. A summary
+        with every month's days also removes the day totals of months it no
+        longer has.
+        """
+        try:
+            for month, days in summary['days'].items():
+                name = ParameterStorage._summary_days_name(month)
+                if month not in summary['months']:
+                    ParameterStorage._delete_blob(index, name)
+                    continue
+                try:
+                    if ParameterStorage._read_decoded(design, name) == days:
+                        continue
+                except ValueError:
+                    pass
+                ParameterStorage._write_blob(index, name, ParameterStorage._encode_payload(days))
+            if set(summary['days']) >= set(summary['months']):
+                names = {ParameterStorage._summary_days_name(month) for month in summary['months']}
+                prefix = ParameterStorage.TIME_DAYS_PREFIX + '_'
+                for name in index.names():
+                    # TimeDays_YYYY_MM, not the chunks or manifest of one
+                    if name.startswith(prefix) and len(name) == len(prefix) + 7 and name not in names:
+                        ParameterStorage._delete_blob(index, name)
             
+            stored = ParameterStorage._public_summary(summary)
             try:
-                # Try to create/update the TimeData parameter
-                param = params.itemByName(ParameterStorage.TIME_DATA_PARAM)
-                
-                if param:
-                    log_info(f"Updating existing parameter: {ParameterStorage.TIME_DATA_PARAM}")
-                    log_parameter_detail(param)
-                    
-                    # Use a properly formatted string expression with quotes
-                    try:
-                        param.expression = f'"{param_expression}"'
-                        log_info("Parameter expression updated")
-                    except Exception as expr_error:
-                        log_error(f"Error updating parameter expression: {str(expr_error)}")
-                        log_debug(f"Expression error traceback: {traceback.format_exc()}")
-                        # If we failed due to size, but sequential storage worked, consider it a success
-                        if large_data:
-                            log_warning("Falling back to sequential storage only")
-                            # Try sequential storage again if we haven't already
-                            success = ParameterStorage.store_time_data_sequential(data)
-                            return success
-                        return False
+                if ParameterStorage._read_decoded(design, ParameterStorage.TIME_SUMMARY_PARAM) == stored:
+                    return
+            except ValueError:
+                pass
+            ParameterStorage._write_blob(index, ParameterStorage.TIME_SUMMARY_PARAM, ParameterStorage._encode_payload(stored))
+            log_debug(f"Stored time summary ({summary['sessions']} sessions)")
+        except Exception as e:
+            # Readers rebuild a missing summary, a stale one would be worse
+            log_warning(f"Failed to store time summary: {str(e)}")
+            ParameterStorage._delete_blob(index, ParameterStorage.TIME_SUMMARY_PARAM)
+    
+    @staticmethod
+    def retrieve_time_data_months(months, design=None):
+        """
+        Retrieve only the sessions of the given months ('YYYY-MM' or 'YYYY_MM'),
+        reading just their shards. Falls back to filtering the full data when
+        time data is not sharded.
+        """
+        keys = {month.replace('-', '_') for month in months}
+        try:
+            if design is None:
+                design = ParameterStorage.get_active_document()
+            if not design:
+                return {"timeTracker": {"sessions": []}}
+            
+            pending = WriteBehindQueue.pending(ParameterStorage.get_document_key(design), ParameterStorage.TIME_DATA_PARAM)
+            if pending is not None:
+                data = ParameterStorage._copy_time_data(pending[0])
+            else:
+                index = ParameterStorage.get_parameter_index(design)
+                if index.get(ParameterStorage.TIME_INDEX_PARAM) is None:
+                    data = ParameterStorage.retrieve_time_data(design)
                 else:
-                    log_info(f"Creating new parameter: {ParameterStorage.TIME_DATA_PARAM}")
-                    try:
-                        # When creating a new parameter, we need to wrap the string in quotes
-                        new_param = params.add(
-                            ParameterStorage.TIME_DATA_PARAM,
-                            adsk.core.ValueInput.createByString(f'"{param_expression}"'),
-                            '',  # unit type (empty for text)
-                            ParameterStorage.PARAM_GROUP
-                        )
-                        if new_param:
-                            log_info("Parameter created successfully")
-                            log_parameter_detail(new_param)
-                        else:
-                            log_warning("Failed to create parameter - no error but null returned")
-                    except Exception as create_error:
-                        log_error(f"Error creating parameter: {str(create_error)}")
-                        log_debug(f"Creation error traceback: {traceback.format_exc()}")
-                        # If we failed due to size, but sequential storage worked, consider it a success
-                        if large_data:
-                            log_warning("Falling back to sequential storage only")
-                            # Try sequential storage again if we haven't already
-                            success = ParameterStorage.store_time_data_sequential(data)
-                            return success
-                        return False
-                
-                # Always store using the sequential parameter approach as backup
-                if not large_data:  # Skip if we already did this for large data
-                    try:
-                        log_info("\nStoring sequential parameters...")
-                        success = ParameterStorage.store_time_data_sequential(data)
-                        if success:
-                            log_info("Sequential parameters created successfully")
-                        else:
-                            log_warning("Failed to create sequential parameters")
-                    except Exception as seq_e:
-                        log_error(f"Sequential parameter error: {str(seq_e)}")
-                        log_debug(f"Sequential parameter error traceback: {traceback.format_exc()}")
-                
-                log_info("Time data stored successfully")
-                log_info("=== END PARAMETER STORAGE DEBUG ===\n")
-                return True
-            except Exception as inner_e:
-                log_error(f"ERROR in parameter creation/update: {str(inner_e)}")
-                log_debug(f"Inner Exception: {traceback.format_exc()}")
+                    data = ParameterStorage._copy_time_data(ParameterStorage._read_time_snapshot(design, keys))
+                    if is_current(data):
+                        data = ParameterStorage._replay_time_journal(index, data)
+                    else:
+                        # Migrating needs every month; the full read writes the result back
+                        data = ParameterStorage.retrieve_time_data(design)
+            
+            tracker = data.setdefault('timeTracker', {})
+            tracker['sessions'] = [s for s in tracker.get('sessions', []) if ParameterStorage._month_key(s) in keys]
+            return data
+        except Exception as e:
+            log_error(f"Failed to retrieve time data for {', '.join(sorted(keys))}: {str(e)}")
+            log_debug(f"Traceback: {traceback.format_exc()}")
+            return {"timeTracker": {"sessions": []}}
+    
+    @staticmethod
+    def append_time_session(session, design=None):
+        """
+        Append one session record to the time journal (TimeJournal1, TimeJournal2, ...).
+        This writes one small parameter however long the history is. Readers replay
+        the journal over the TimeData snapshot, where a record replaces the session
+        with the same id. Once the journal holds JOURNAL_COMPACT_THRESHOLD records
+        it is compacted into the snapshot.
+        """
+        try:
+            if design is None:
+                design = ParameterStorage.get_active_document()
+            if not design:
+                log_error("Failed to get active document")
                 return False
+            
+            doc_key = ParameterStorage.get_document_key(design)
+            if WriteBehindQueue.enabled and WriteBehindQueue.save_with_document and doc_key:
+                # Nothing is written before the document is saved; hold the full data instead
+                data = ParameterStorage.retrieve_time_data(design)
+                ParameterStorage._replay_records(data, [session])
+                ParameterStorage._bump_generation(doc_key)
+                return WriteBehindQueue.submit(
+                    doc_key, ParameterStorage.TIME_DATA_PARAM,
+                    ParameterStorage.store_time_data, data, design
+                )
+            
+            # A queued full write would replace the journal, so it has to land first
+            if doc_key:
+                WriteBehindQueue.flush(doc_key)
+            
+            payload = ParameterStorage._encode_payload(session)
+            if len(payload) > ParameterStorage.MAX_PARAM_LENGTH:
+                log_warning(f"Session record too large for the journal ({len(payload)} characters)")
+                return False
+            
+            index = ParameterStorage.get_parameter_index(design)
+            journal = index.sequence(ParameterStorage.JOURNAL_PREFIX)
+            number = journal[-1][0] + 1 if journal else 1
+            # Worked out before the record is written, which hides the version it replaces
+            summary = ParameterStorage._updated_time_summary(design, index, session)
+            # The record and the summary form one bulk mutation
+            with ParameterStorage._deferred_compute(design):
+                ParameterStorage._set_string_param(index, f"{ParameterStorage.JOURNAL_PREFIX}{number}", payload)
+                if summary is None:
+                    summary = ParameterStorage._summarize_time_data(ParameterStorage.retrieve_time_data(design))
+                ParameterStorage._store_time_summary(design, index, summary)
+            ParameterStorage._remember_hash(design, ParameterStorage.TIME_DATA_PARAM, None)
+            ParameterStorage._bump_generation(doc_key)
+            log_info(f"Appended session record {ParameterStorage.JOURNAL_PREFIX}{number}")
+            
+            if len(journal) + 1 >= ParameterStorage.JOURNAL_COMPACT_THRESHOLD:
+                ParameterStorage.compact_time_journal(design)
+            return True
         except Exception as e:
-            log_error(f"CRITICAL ERROR: Failed to store time data: {str(e)}")
+            log_error(f"Failed to append session record: {str(e)}")
             log_debug(f"Traceback: {traceback.format_exc()}")
             return False
     
     @staticmethod
-    def store_time_data_sequential(data):
+    def compact_time_journal(design=None):
+        """Fold the time journal into the TimeData snapshot."""
+        if design is None:
+            design = ParameterStorage.get_active_document()
+        if not design:
+            return False
+        log_info("Compacting time journal into TimeData")
+        # Reading replays the journal; storing writes the snapshot and clears it
+        data = ParameterStorage.retrieve_time_data(design)
+        return ParameterStorage.store_time_data(data, design)
+    
+    @staticmethod
+    def _journal_records(index):
+        """Decode the time journal records in order."""
+        records = []
+        for number, param in index.sequence(ParameterStorage.JOURNAL_PREFIX):
+            name = f"{ParameterStorage.JOURNAL_PREFIX}{number}"
+            try:
+                records.append(ParameterStorage._decode_payload(ParameterStorage._get_string_param(index, name)))
+            except ValueError as decode_error:
+                log_warning(f"Skipping damaged journal record {name}: {decode_error}")
+        return records
+    
+    @staticmethod
+    def _replay_time_journal(index, data):
+        """Apply the time journal to snapshot data in place and return it."""
+        records = ParameterStorage._journal_records(index)
+        if not records:
+            return data
+        ParameterStorage._replay_records(data, records)
+        log_info(f"Replayed {len(records)} journal record(s)")
+        return data
+    
+    @staticmethod
+    def _replay_records(data, records):
+        """Apply session records to time data in place, replacing sessions with the same id."""
+        sessions = data.setdefault('timeTracker', {}).setdefault('sessions', [])
+        positions = {session['id']: i for i, session in enumerate(sessions) if isinstance(session, dict) and 'id' in session}
+        for record in records:
+            position = positions.get(record.get('id')) if 'id' in record else None
+            if position is None:
+                if 'id' in record:
+                    positions[record['id']] = len(sessions)
+                sessions.append(record)
+            else:
+                sessions[position] = record
+    
+    @staticmethod
+    def _clear_time_journal(index):
+        """Delete all time journal records."""
+        for number, param in index.sequence(ParameterStorage.JOURNAL_PREFIX):
+            ParameterStorage._delete_param(index, f"{ParameterStorage.JOURNAL_PREFIX}{number}")
+    
+    @staticmethod
+    def recover_pending_writes(design=None):
+        """
+        Queue writes for the design that were held for a document save when Fusion
+        last stopped (save-with-document mode). Writes already queued in this
+        session are newer and are kept.
+        """
+        try:
+            if design is None:
+                design = ParameterStorage.get_active_document()
+            if not design:
+                return 0
+            doc_key = ParameterStorage.get_document_key(design)
+            writers = {
+                ParameterStorage.TIME_DATA_PARAM: ParameterStorage.store_time_data,
+                ParameterStorage.NOTES_DATA_PARAM: ParameterStorage.store_notes_data,
+            }
+            recovered = 0
+            for name, value in WriteBehindQueue.recover(doc_key).items():
+                if name in writers and WriteBehindQueue.pending(doc_key, name) is None:
+                    if name == ParameterStorage.TIME_DATA_PARAM:
+                        # Held by an older version of the add-in, perhaps
+                        value = ParameterStorage._current_time_data(value)
+                    WriteBehindQueue.submit(doc_key, name, writers[name], value, design)
+                    ParameterStorage._bump_generation(doc_key)
+                    recovered += 1
+            if recovered:
+                log_info(f"Recovered {recovered} unsaved write(s) for {design.parentDocument.name}")
+            return recovered
+        except Exception as e:
+            log_error(f"Failed to recover pending writes: {str(e)}")
+            log_debug(f"Traceback: {traceback.format_exc()}")
+            return 0
+    
+    @staticmethod
+    def queue_time_data(data):
+        """
+        Queue time data for the active document through the write-behind queue.
+        Saves arriving in quick succession are merged into one write.
+        """
+        design = ParameterStorage.get_active_document()
+        if not design:
+            log_error("CRITICAL ERROR: Failed to get active document")
+            return False
+        ParameterStorage._bump_generation(ParameterStorage.get_document_key(design))
+        return WriteBehindQueue.submit(
+            ParameterStorage.get_document_key(design), ParameterStorage.TIME_DATA_PARAM,
+            ParameterStorage.store_time_data, ParameterStorage._current_time_data(data), design
+        )
+    
+    @staticmethod
+    def get_document_key(design):
+        """Return a stable key identifying the document that owns the design."""
+        try:
+            return ParameterStorage.get_key_for_document(design.parentDocument)
+        except Exception:
+            return ''
+    
+    @staticmethod
+    def get_key_for_document(doc):
+        """Return a stable key identifying a document."""
+        try:
+            creation_id = getattr(doc, 'creationId', '')
+            if creation_id:
+                return creation_id
+            if doc.dataFile:
+                return doc.dataFile.id
+            return doc.name
+        except Exception:
+            return ''
+    
+    @staticmethod
+    def _sequential_time_entries(data):
+        """Flatten time data into the (seconds, comment) pairs stored in Time1..TimeN."""
+        entries = []
+        timeTracker = data.get('timeTracker', {})
+        for session in timeTracker.get('sessions', []):
+            # A running session has no duration yet
+            if isinstance(session.get('duration'), (int, float)):
+                entries.append((float(session['duration']), f"Time entry on {session.get('date', '')}"))
+        return entries
+    
+    @staticmethod
+    def store_time_data_sequential(data, incremental=True, design=None):
         """
         Store time data using sequential parameters (Time1, Time2, etc.)
-        Each parameter stores seconds as value and date info in comments
+        Each parameter stores seconds as value and date info in comments.
+        
+        In incremental mode the new entries are diffed against what is stored and
+        only the changed TimeN parameters are added, updated or deleted, so the
+        cost of a save follows the size of the change rather than the history.
+        The result of the last sync is kept in last_sequential_sync.
         """
+        doc_key = ''
         try:
-            design = ParameterStorage.get_active_document()
+            if design is None:
+                design = ParameterStorage.get_active_document()
             if not design:
                 return False
                 
             # Get user parameters
-            params = design.userParameters
-            
-            # First, delete any existing Time parameters
-            time_params = []
-            for i in range(params.count):
-                param = params.item(i)
-                if param.name.startswith(ParameterStorage.TIME_PREFIX):
-                    time_params.append(param)
+            index = ParameterStorage.get_parameter_index(design)
+            doc_key = ParameterStorage.get_document_key(design)
+            prefix = ParameterStorage.TIME_PREFIX
+            stats = {'added': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'api_calls': 0}
             
-            log_debug(f"Found {len(time_params)} existing time parameters to delete")
-            
-            # Delete in reverse order to avoid index issues
-            for param in reversed(time_params):
-                param_name = param.name
-                try:
-                    param.deleteMe()
-                    log_debug(f"Deleted parameter {param_name}")
-                except Exception as delete_err:
-                    log_error(f"Error deleting parameter {param_name}: {str(delete_err)}")
+            with ParameterStorage._deferred_compute(design):
+                # Work out what is currently stored: number -> (seconds, comment, param)
+                stored = {}
+                previous = ParameterStorage._sequential_synced.get(doc_key) if incremental else None
+                if previous is not None:
+                    # We wrote these ourselves, no need to read them back
+                    for number, (seconds, comment) in enumerate(previous, start=1):
+                        stored[number] = (seconds, comment, None)
+                else:
+                    existing = index.sequence(prefix)
+                    log_debug(f"Found {len(existing)} existing time parameters")
                 
-            # Now create new parameters for each time entry
-            timeTracker = data.get('timeTracker', {})
-            sessions = timeTracker.get('sessions', [])
+                    if incremental:
+                        for number, param in existing:
+                            stored[number] = (param.value, param.comment, param)
+                            stats['api_calls'] += 2
+                    else:
+                        # Full rewrite - delete in reverse order to avoid index issues
+                        for number, param in reversed(existing):
+                            param_name = f"{prefix}{number}"
+                            try:
+                                param.deleteMe()
+                                index.removed(param_name)
+                                stats['deleted'] += 1
+                                stats['api_calls'] += 1
+                                log_debug(f"Deleted parameter {param_name}")
+                            except Exception as delete_err:
+                                log_error(f"Error deleting parameter {param_name}: {str(delete_err)}")
             
-            log_debug(f"Creating parameters for {len(sessions)} sessions")
+                entries = ParameterStorage._sequential_time_entries(data)
+                log_debug(f"Syncing {len(entries)} time entries against {len(stored)} stored parameters")
             
-            # Create time parameters
-            param_index = 1
-            for session in sessions:
-                date = session.get('date', '')
-                times = session.get('times', [])
-                
-                log_debug(f"Session {date} has {len(times)} time entries")
-                
-                for time_value in times:
-                    param_name = f"{ParameterStorage.TIME_PREFIX}{param_index}"
+                # Forget the synced state until this sync completes
+                ParameterStorage._sequential_synced.pop(doc_key, None)
+                complete = True
+            
+                for number, (seconds, comment) in enumerate(entries, start=1):
+                    param_name = f"{prefix}{number}"
+                    current = stored.pop(number, None)
                     try:
-                        params.add(
+                        if current is not None:
+                            stored_seconds, stored_comment, param = current
+                            if abs(stored_seconds - seconds) < 1e-6 and stored_comment == comment:
+                                stats['unchanged'] += 1
+                                continue
+                        
+                            if param is None:
+                                param = index.get(param_name)
+                            if param:
+                                if abs(stored_seconds - seconds) >= 1e-6:
+                                    param.value = seconds
+                                    stats['api_calls'] += 1
+                                if stored_comment != comment:
+                                    param.comment = comment
+                                    stats['api_calls'] += 1
+                                stats['updated'] += 1
+                                continue
+                    
+                        ParameterStorage._add_param(
+                            index,
                             param_name,
-                            adsk.core.ValueInput.createByReal(time_value),
+                            adsk.core.ValueInput.createByReal(seconds),
                             's',  # seconds
-                            f"Time entry on {date}"
+                            comment
                         )
-                        param_index += 1
-                    except Exception as create_err:
-                        log_error(f"Error creating parameter {param_name}: {str(create_err)}")
+                        stats['added'] += 1
+                        stats['api_calls'] += 1
+                    except Exception as write_err:
+                        complete = False
+                        log_error(f"Error writing parameter {param_name}: {str(write_err)}")
+            
+                # Anything left over is no longer part of the history
+                for number in sorted(stored, reverse=True):
+                    param_name = f"{prefix}{number}"
+                    param = stored[number][2]
+                    try:
+                        if param is None:
+                            param = index.get(param_name)
+                        if param:
+                            param.deleteMe()
+                            index.removed(param_name)
+                            stats['deleted'] += 1
+                            stats['api_calls'] += 1
+                            log_debug(f"Deleted parameter {param_name}")
+                    except Exception as delete_err:
+                        complete = False
+                        log_error(f"Error deleting parameter {param_name}: {str(delete_err)}")
             
-            log_info(f"Created {param_index-1} sequential time parameters")
+            if complete:
+                ParameterStorage._sequential_synced[doc_key] = entries
+            ParameterStorage.last_sequential_sync = stats
+            log_info(
+                f"Synced {len(entries)} sequential time parameters: "
+                f"{stats['added']} added, {stats['updated']} updated, {stats['deleted']} deleted, "
+                f"{stats['unchanged']} unchanged ({stats['api_calls']} API calls)"
+            )
             return True
         except Exception as e:
+            ParameterStorage.invalidate_parameter_index(doc_key)
             log_error(f"Failed to store sequential time data: {str(e)}")
             log_debug(f"Traceback: {traceback.format_exc()}")
             return False
     
     @staticmethod
-    def retrieve_time_data():
-        """Retrieve time tracking data from document parameters."""
+    def retrieve_time_data(design=None):
+        """
+        Retrieve time tracking data from document parameters (of the active document
+        by default), with the time journal replayed over it.
+        """
         try:
             log_info("\n=== PARAMETER RETRIEVAL DEBUG ===")
             log_info("Attempting to retrieve time data from parameters")
-            design = ParameterStorage.get_active_document()
+            if design is None:
+                design = ParameterStorage.get_active_document()
             if not design:
                 log_warning("No active document available - returning empty data structure")
                 log_info("=== END PARAMETER RETRIEVAL DEBUG ===\n")
                 return {"timeTracker": {"sessions": []}}
                 
+            # Data still waiting in the write-behind queue is the latest
+            pending = WriteBehindQueue.pending(ParameterStorage.get_document_key(design), ParameterStorage.TIME_DATA_PARAM)
+            if pending is not None:
+                log_info("Returning time data from pending write")
+                log_info("=== END PARAMETER RETRIEVAL DEBUG ===\n")
+                return ParameterStorage._copy_time_data(pending[0])
+            
             # Debug parameter count
-            params = design.userParameters
-            log_info(f"Found {params.count} total user parameters")
-            
-            # List all parameter names for debugging
-            param_names = []
-            for i in range(params.count):
-                param = params.item(i)
-                param_names.append(f"{param.name} ({param.value})")
-            log_info(f"Parameter names: {', '.join(param_names)}")
-            
-            # First try to get from the JSON parameter
-            param = params.itemByName(ParameterStorage.TIME_DATA_PARAM)
-            
-            if param:
-                log_info(f"Found main TimeData parameter")
-                log_parameter_detail(param)
+            index = ParameterStorage.get_parameter_index(design)
+            log_info(f"Found {index.count} total user parameters")
+            log_debug(f"Parameter names: {', '.join(index.names())}")
+            
+            # First try the monthly shards or the TimeData parameter (single or chunked)
+            try:
+                data = ParameterStorage._read_time_snapshot(design)
+            except (KeyError, ValueError) as decode_error:
+                log_error(f"Time data decode error: {decode_error}")
                 
-                # Get JSON string from parameter expression
-                json_str = param.expression
+                # Try to reconstruct from sequential parameters
+                log_info("Attempting to reconstruct from sequential parameters")
+                data = ParameterStorage.retrieve_time_data_sequential(design)
+                log_info("=== END PARAMETER RETRIEVAL DEBUG ===\n")
+                return ParameterStorage._replay_time_journal(index, data)
+            
+            if data is not None:
+                log_info("Found main TimeData parameter")
+                # Callers get their own copy; the cached object stays untouched
+                data = ParameterStorage._copy_time_data(data)
+                ParameterStorage._remember_hash(design, ParameterStorage.TIME_DATA_PARAM, ParameterStorage._data_hash(data))
+                log_info("Time data parsed successfully")
                 
-                # Log the raw expression
-                log_debug(f"Raw parameter expression: {json_str[:30]}...")
+                # Debug the data structure
+                sessions = data.get('timeTracker', {}).get('sessions', [])
+                session_count = len(sessions)
+                log_info(f"Retrieved {session_count} sessions from TimeData parameter")
                 
-                # Remove surrounding quotes if present
-                if json_str.startswith('"') and json_str.endswith('"'):
-                    json_str = json_str[1:-1]
-                    log_debug("Removed surrounding quotes")
-                    
-                # Handle escaped quotes if present
-                json_str = json_str.replace('\\"', '"')
-                log_debug("Replaced escaped quotes")
+                if session_count > 0:
+                    # Log first session details
+                    first_session = sessions[0]
+                    log_info(f"First session - Date: {first_session.get('date', 'unknown')}, Duration: {first_session.get('duration')}")
                 
-                log_debug(f"Processed JSON string, length: {len(json_str)}")
-                log_debug(f"First 30 chars: {json_str[:30]}...")
+                data = ParameterStorage._replay_time_journal(index, data)
+                if not is_current(data):
+                    # Data from an older version is converted once and written back
+                    data = ParameterStorage._current_time_data(data)
+                    ParameterStorage.store_time_data(data, design)
                 
-                # Parse JSON data
-                try:
-                    data = json.loads(json_str)
-                    log_info("Time data parsed successfully")
-                    
-                    # Debug the data structure
-                    sessions = data.get('timeTracker', {}).get('sessions', [])
-                    session_count = len(sessions)
-                    log_info(f"Retrieved {session_count} sessions from TimeData parameter")
-                    
-                    if session_count > 0:
-                        # Log first session details
-                        first_session = sessions[0]
-                        log_info(f"First session - Date: {first_session.get('date', 'unknown')}, Times count: {len(first_session.get('times', []))}")
-                    
-                    log_info("=== END PARAMETER RETRIEVAL DEBUG ===\n")
-                    return data
-                except json.JSONDecodeError as je:
-                    log_error(f"JSON parse error: {je}")
-                    log_debug(f"Error at position {je.pos}: {json_str[max(0, je.pos-10):min(len(json_str), je.pos+10)]}")
-                    
-                    # Try to reconstruct from sequential parameters
-                    log_info("Attempting to reconstruct from sequential parameters")
-                    data = ParameterStorage.retrieve_time_data_sequential()
-                    log_info("=== END PARAMETER RETRIEVAL DEBUG ===\n")
-                    return data
+                log_info("=== END PARAMETER RETRIEVAL DEBUG ===\n")
+                return data
             else:
                 log_info("TimeData parameter not found, trying sequential parameters")
                 # Try to reconstruct from sequential parameters
-                data = ParameterStorage.retrieve_time_data_sequential()
+                data = ParameterStorage.retrieve_time_data_sequential(design)
                 
                 # Verify the data structure
                 if data and 'timeTracker' in data and 'sessions' in data['timeTracker']:
@@ -343,13 +1450,11 @@ class ParameterStorage:
                         first_session = sessions[0]
                         if 'date' not in first_session:
                             log_warning("Missing date field in first session, might be data format issue")
-                        if 'times' in first_session:
-                            log_info(f"First session has {len(first_session['times'])} time entries")
                 else:
                     log_warning("No valid data structure from sequential parameters")
                     
                 log_info("=== END PARAMETER RETRIEVAL DEBUG ===\n")
-                return data
+                return ParameterStorage._replay_time_journal(index, data)
         except Exception as e:
             log_error(f"Failed to retrieve time data: {str(e)}")
             log_debug(f"Traceback: {traceback.format_exc()}")
@@ -357,24 +1462,22 @@ class ParameterStorage:
             return {"timeTracker": {"sessions": []}}
     
     @staticmethod
-    def retrieve_time_data_sequential():
+    def retrieve_time_data_sequential(design=None):
         """
         Reconstruct time data from sequential parameters (Time1, Time2, etc.)
         """
         try:
-            design = ParameterStorage.get_active_document()
+            if design is None:
+                design = ParameterStorage.get_active_document()
             if not design:
                 log_warning("No active document available for sequential parameter retrieval")
                 return {"timeTracker": {"sessions": []}}
                 
-            params = design.userParameters
+            index = ParameterStorage.get_parameter_index(design)
             
-            # Find all Time parameters
-            time_params = []
-            for i in range(params.count):
-                param = params.item(i)
-                if param.name.startswith(ParameterStorage.TIME_PREFIX):
-                    time_params.append(param)
+            # Find all Time parameters, sorted by parameter number
+            numbered_params = index.sequence(ParameterStorage.TIME_PREFIX)
+            time_params = [param for number, param in numbered_params]
             
             log_debug(f"Found {len(time_params)} sequential time parameters")
             
@@ -382,21 +1485,13 @@ class ParameterStorage:
                 log_warning("No time parameters found in document")
                 return {"timeTracker": {"sessions": []}}
             
-            # Sort by parameter number - IMPROVED SORTING
-            def get_param_number(param):
-                try:
-                    return int(param.name[len(ParameterStorage.TIME_PREFIX):])
-                except ValueError:
-                    return 9999  # Default high value for invalid formats
-                    
-            time_params.sort(key=get_param_number)
-            
             # Log the sorted parameters for debugging
             sorted_params = [f"{p.name}={p.value}" for p in time_params[:5]]
             log_debug(f"First few sorted parameters: {', '.join(sorted_params)}")
             
             # Reconstruct sessions by date
             sessions_by_date = {}
+            stored_entries = []
             for param in time_params:
                 # Extract date from comment
                 comment = param.comment
@@ -406,6 +1501,7 @@ class ParameterStorage:
                 
                 # Get time value in seconds
                 seconds = param.value
+                stored_entries.append((seconds, comment))
                 log_debug(f"Parameter {param.name}: {seconds}s on {date}")
                 
                 # Add to sessions by date
@@ -413,52 +1509,17 @@ class ParameterStorage:
                     sessions_by_date[date] = []
                 sessions_by_date[date].append(seconds)
             
-            # Convert to sessions array
-            sessions = []
-            for date, times in sessions_by_date.items():
-                sessions.append({
-                    "date": date,
-                    "times": times
-                })
-            
-            # Sort sessions by date
-            sessions.sort(key=lambda s: s["date"])
-            
-            # Create the full data structure
-            data = {
-                "timeTracker": {
-                    "sessions": sessions
-                }
-            }
-            
-            log_info(f"Reconstructed time data from {len(time_params)} sequential parameters")
-            log_info(f"Created {len(sessions)} session entries")
+            # Remember what is stored so the next incremental sync needs no re-read
+            if [number for number, param in numbered_params] == list(range(1, len(numbered_params) + 1)):
+                doc_key = ParameterStorage.get_document_key(design)
+                ParameterStorage._sequential_synced[doc_key] = stored_entries
             
-            # Log detailed session information for debugging
-            for i, session in enumerate(sessions):
-                log_info(f"Session {i+1}: Date: {session['date']}, Times count: {len(session['times'])}")
-                if len(session['times']) > 0:
-                    log_debug(f"  First time: {session['times'][0]} seconds")
-                    
-            # Make sure this is compatible with the TimeTracker.py expectations 
-            # and the HTML palette's expected format
-            log_debug("Checking for format compatibility with TimeTracker.py")
-            
-            # Check if this data structure is correct based on TimeTracker.py expectations
-            if sessions and len(sessions) > 0:
-                # Test accessing a session and time entry
-                try:
-                    test_session = sessions[0]
-                    test_date = test_session.get('date', 'No date')
-                    test_times = test_session.get('times', [])
-                    test_count = len(test_times)
-                    log_debug(f"Format check: First session date: {test_date}, times count: {test_count}")
-                    
-                    if test_count > 0:
-                        log_debug(f"Format check: First time value: {test_times[0]}")
-                except Exception as fmt_err:
-                    log_error(f"Format compatibility check failed: {str(fmt_err)}")
+            # Day entries sorted by date, converted to session records
+            days = [{"date": date, "times": times} for date, times in sorted(sessions_by_date.items())]
+            data = migrate_time_data({"timeTracker": {"sessions": days}})
             
+            log_info(f"Reconstructed time data from {len(time_params)} sequential parameters")
+            log_info(f"Created {len(data['timeTracker']['sessions'])} session records over {len(days)} date(s)")
             return data
         except Exception as e:
             log_error(f"Failed to retrieve sequential time data: {str(e)}")
@@ -466,46 +1527,44 @@ class ParameterStorage:
             return {"timeTracker": {"sessions": []}}
     
     @staticmethod
-    def store_notes_data(notes):
-        """Store notes data in document parameters."""
+    def store_notes_data(notes, design=None):
+        """Store notes data in document parameters (of the active document by default)."""
         try:
             log_info("Attempting to store notes data in parameters")
-            design = ParameterStorage.get_active_document()
+            if design is None:
+                design = ParameterStorage.get_active_document()
             if not design:
                 log_error("Failed to get active document")
                 return False
+            
+            # This write supersedes any queued one
+            WriteBehindQueue.discard(ParameterStorage.get_document_key(design), ParameterStorage.NOTES_DATA_PARAM)
                 
-            # Convert data to JSON string
-            json_data = json.dumps({"notes": notes})
-            log_debug(f"Notes JSON length: {len(json_data)}")
-            
-            # Properly escape quotes for parameter expression
-            param_expression = json_data.replace('"', '\\"')
-            
-            # Get or create the parameter
-            params = design.userParameters
-            param = params.itemByName(ParameterStorage.NOTES_DATA_PARAM)
-            
-            if param:
-                log_info(f"Updating existing parameter: {ParameterStorage.NOTES_DATA_PARAM}")
-                log_parameter_detail(param)
-                # Update existing parameter
-                param.expression = f'"{param_expression}"'
-            else:
-                log_info(f"Creating new parameter: {ParameterStorage.NOTES_DATA_PARAM}")
-                # Create new parameter
-                new_param = params.add(
-                    ParameterStorage.NOTES_DATA_PARAM,
-                    adsk.core.ValueInput.createByString(f'"{param_expression}"'),
-                    '',  # unit type (empty for text)
-                    ParameterStorage.PARAM_GROUP
-                )
-                if new_param:
-                    log_parameter_detail(new_param)
+            # Nothing to do if these are exactly the notes already stored
+            index = ParameterStorage.get_parameter_index(design)
+            name = ParameterStorage.NOTES_DATA_PARAM
+            notes_hash = ParameterStorage._data_hash(notes)
+            snapshot_exists = index.get(name) or index.get(name + ParameterStorage.MANIFEST_SUFFIX)
+            if snapshot_exists and ParameterStorage._is_unchanged(design, name, notes_hash):
+                ParameterStorage.write_stats['skipped'] += 1
+                log_info("Notes unchanged, skipping parameter write")
+                return True
+            ParameterStorage.write_stats['performed'] += 1
+            ParameterStorage._remember_hash(design, name, None)
+            
+            # Encode data for the parameter expression
+            payload = ParameterStorage._encode_payload({"notes": notes})
+            log_debug(f"Notes payload length: {len(payload)}")
+            
+            with ParameterStorage._deferred_compute(design):
+                # Create or update the parameter(s)
+                param_count = ParameterStorage._write_blob(index, ParameterStorage.NOTES_DATA_PARAM, payload)
+                log_info(f"Notes data written to {param_count} parameter(s)")
             
-            # Also store using the sequential parameter approach
-            ParameterStorage.store_notes_data_sequential(notes)
+                # Also store using the sequential parameter approach
+                ParameterStorage.store_notes_data_sequential(notes, design=design)
             
+            ParameterStorage._remember_hash(design, name, notes_hash)
             log_info("Notes data stored successfully")
             return True
         except Exception as e:
@@ -514,61 +1573,73 @@ class ParameterStorage:
             return False
             
     @staticmethod
-    def store_notes_data_sequential(notes):
+    def queue_notes_data(notes):
+        """Queue notes for the active document through the write-behind queue."""
+        design = ParameterStorage.get_active_document()
+        if not design:
+            log_error("Failed to get active document")
+            return False
+        return WriteBehindQueue.submit(
+            ParameterStorage.get_document_key(design), ParameterStorage.NOTES_DATA_PARAM,
+            ParameterStorage.store_notes_data, notes, design
+        )
+    
+    @staticmethod
+    def store_notes_data_sequential(notes, design=None):
         """
         Store notes using sequential parameters (Note1, Note2, etc.)
         Each parameter stores its index as value and note content in comments
         """
         try:
-            design = ParameterStorage.get_active_document()
+            if design is None:
+                design = ParameterStorage.get_active_document()
             if not design:
                 return False
                 
             # Get user parameters
-            params = design.userParameters
+            index = ParameterStorage.get_parameter_index(design)
             
-            # First, delete any existing Note parameters
-            note_params = []
-            for i in range(params.count):
-                param = params.item(i)
-                if param.name.startswith(ParameterStorage.NOTE_PREFIX):
-                    note_params.append(param)
+            with ParameterStorage._deferred_compute(design):
+                # First, delete any existing Note parameters
+                note_params = index.sequence(ParameterStorage.NOTE_PREFIX)
             
-            log_debug(f"Found {len(note_params)} existing note parameters to delete")
+                log_debug(f"Found {len(note_params)} existing note parameters to delete")
             
-            # Delete in reverse order to avoid index issues
-            for param in reversed(note_params):
-                param_name = param.name
-                try:
-                    param.deleteMe()
-                    log_debug(f"Deleted parameter {param_name}")
-                except Exception as delete_err:
-                    log_error(f"Error deleting parameter {param_name}: {str(delete_err)}")
+                # Delete in reverse order to avoid index issues
+                for number, param in reversed(note_params):
+                    param_name = f"{ParameterStorage.NOTE_PREFIX}{number}"
+                    try:
+                        param.deleteMe()
+                        index.removed(param_name)
+                        log_debug(f"Deleted parameter {param_name}")
+                    except Exception as delete_err:
+                        log_error(f"Error deleting parameter {param_name}: {str(delete_err)}")
             
-            # If notes is empty, we're done
-            if not notes:
-                return True
+                # If notes is empty, we're done
+                if not notes:
+                    return True
                 
-            # Split notes into lines
-            note_lines = notes.split('\n')
+                # Split notes into lines
+                note_lines = notes.split('\n')
             
-            log_debug(f"Creating parameters for {len(note_lines)} note lines")
+                log_debug(f"Creating parameters for {len(note_lines)} note lines")
             
-            # Create a parameter for each line
-            notes_created = 0
-            for i, line in enumerate(note_lines):
-                if line.strip():  # Only store non-empty lines
-                    param_name = f"{ParameterStorage.NOTE_PREFIX}{i+1}"
-                    try:
-                        params.add(
-                            param_name,
-                            adsk.core.ValueInput.createByReal(i+1),  # Index as value
-                            '',  # No unit
-                            line  # Note content as comment
-                        )
-                        notes_created += 1
-                    except Exception as create_err:
-                        log_error(f"Error creating parameter {param_name}: {str(create_err)}")
+                # Create a parameter for each line
+                notes_created = 0
+                for i, line in enumerate(note_lines):
+                    if line.strip():  # Only store non-empty lines
+                        param_name = f"{ParameterStorage.NOTE_PREFIX}{i+1}"
+                        try:
+                            ParameterStorage._add_param(
+                                index,
+                                param_name,
+                                adsk.core.ValueInput.createByReal(i+1),  # Index as value
+                                '',  # No unit
+                                line  # Note content as comment
+                            )
+                            notes_created += 1
+                        except Exception as create_err:
+                            log_error(f"Error creating parameter {param_name}: {str(create_err)}")
             
             log_info(f"Created {notes_created} sequential note parameters")
             return True
@@ -587,36 +1658,24 @@ class ParameterStorage:
                 log_error("Failed to get active document")
                 return None
                 
-            # First try to get from the JSON parameter
-            params = design.userParameters
-            param = params.itemByName(ParameterStorage.NOTES_DATA_PARAM)
+            # Notes still waiting in the write-behind queue are the latest
+            pending = WriteBehindQueue.pending(ParameterStorage.get_document_key(design), ParameterStorage.NOTES_DATA_PARAM)
+            if pending is not None:
+                return pending[0]
             
-            if param:
-                log_info(f"Found main NotesData parameter")
-                log_parameter_detail(param)
-                
-                # Get JSON string from parameter expression
-                json_str = param.expression
-                
-                # Remove surrounding quotes if present
-                if json_str.startswith('"') and json_str.endswith('"'):
-                    json_str = json_str[1:-1]
-                    
-                # Handle escaped quotes if present
-                json_str = json_str.replace('\\"', '"')
-                
-                log_debug(f"Retrieved notes JSON string, length: {len(json_str)}")
-                
-                # Parse JSON data
-                try:
-                    data = json.loads(json_str)
-                    log_info("Notes data parsed successfully")
-                    return data.get("notes", "")
-                except json.JSONDecodeError as je:
-                    log_error(f"JSON parse error: {je}")
-                    log_debug(f"Error at position {je.pos}: {json_str[max(0, je.pos-10):min(len(json_str), je.pos+10)]}")
-                    # Try to reconstruct from sequential parameters
-                    return ParameterStorage.retrieve_notes_data_sequential()
+            # First try to get from the NotesData parameter (single or chunked)
+            try:
+                data = ParameterStorage._read_decoded(design, ParameterStorage.NOTES_DATA_PARAM)
+            except (ValueError, KeyError) as decode_error:
+                log_error(f"Notes data decode error: {decode_error}")
+                # Try to reconstruct from sequential parameters
+                return ParameterStorage.retrieve_notes_data_sequential()
+            
+            if data is not None:
+                log_info("Found main NotesData parameter")
+                notes = data.get("notes", "")
+                ParameterStorage._remember_hash(design, ParameterStorage.NOTES_DATA_PARAM, ParameterStorage._data_hash(notes))
+                return notes
             else:
                 log_info("NotesData parameter not found, trying sequential parameters")
                 # Try to reconstruct from sequential parameters
@@ -636,23 +1695,16 @@ class ParameterStorage:
             if not design:
                 return None
                 
-            params = design.userParameters
+            index = ParameterStorage.get_parameter_index(design)
             
-            # Find all Note parameters
-            note_params = []
-            for i in range(params.count):
-                param = params.item(i)
-                if param.name.startswith(ParameterStorage.NOTE_PREFIX):
-                    note_params.append(param)
+            # Find all Note parameters, sorted by parameter number
+            note_params = [param for number, param in index.sequence(ParameterStorage.NOTE_PREFIX)]
             
             log_debug(f"Found {len(note_params)} sequential note parameters")
             
             if not note_params:
                 return ""
             
-            # Sort by parameter number
-            note_params.sort(key=lambda p: int(p.name[len(ParameterStorage.NOTE_PREFIX):]))
-            
             # Reconstruct notes from comments
             note_lines = []
             for param in note_params:
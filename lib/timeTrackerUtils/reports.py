@@ -0,0 +1,139 @@
+from datetime import date, datetime
+
+from .session_record import SessionRecord, to_seconds
+
+# Rollups in a report, each a list of {key, seconds, sessions} sorted by key
+ROLLUPS = ('days', 'weeks', 'months', 'projects')
+
+_SECONDS_PER_DAY = 86400
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def _start_seconds(record):
+    """Start of a session in epoch seconds, the start of its date if it has no start time, or None."""
+    if record.start is not None:
+        return record.start
+    try:
+        return to_seconds(datetime.strptime(record.date, '%Y-%m-%d'))
+    except (TypeError, ValueError):
+        return None
+
+def session_columns(sessions):
+    """
+    Column lists for a report: start seconds, duration and project code per
+    session, the project paths by code, and [seconds, count] of sessions with
+    neither a start time nor a date, which only count towards the totals.
+    """
+    starts, durations, codes = [], [], []
+    projects = {}
+    undated = [0.0, 0]
+    for session in sessions:
+        record = session if isinstance(session, SessionRecord) else SessionRecord.from_dict(session)
+        duration = record.duration or 0
+        start = _start_seconds(record)
+        if start is None:
+            undated[0] += duration
+            undated[1] += 1
+            continue
+        starts.append(start)
+        durations.append(duration)
+        codes.append(projects.setdefault(record.project_path or '', len(projects)))
+    return starts, durations, codes, list(projects), undated
+
+def _iso_week_key(day_number):
+    year, week, weekday = date.fromordinal(day_number + _EPOCH_ORDINAL).isocalendar()
+    return f"{year:04d}-W{week:02d}"
+
+def _day_key(day_number):
+    return date.fromordinal(day_number + _EPOCH_ORDINAL).isoformat()
+
+def _month_key(month_number):
+    year, month = divmod(month_number, 12)
+    return f"{year + 1970:04d}-{month + 1:02d}"
+
+def _rollup(keys, seconds, counts):
+    return [{'key': key, 'seconds': float(total), 'sessions': int(count)} for key, total, count in zip(keys, seconds, counts)]
+
+def _report_numpy(np, starts, durations, codes, projects):
+    starts = np.asarray(starts, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+
+    days = np.floor_divide(starts, _SECONDS_PER_DAY).astype(np.int64)
+    # 1970-01-01 was a Thursday; Monday is 0
+    weekdays = (days + 3) % 7
+    hours = (np.floor_divide(starts - days * _SECONDS_PER_DAY, 3600)).astype(np.int64)
+    # ISO weeks are numbered by the year of their Thursday
+    thursdays = days - weekdays + 3
+    week_years = thursdays.astype('datetime64[D]').astype('datetime64[Y]')
+    weeks = week_years.astype(np.int64) * 100 + (thursdays - week_years.astype('datetime64[D]').astype(np.int64)) // 7 + 1
+    months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+    def group(values):
+        unique, inverse = np.unique(values, return_inverse=True)
+        return unique, np.bincount(inverse, weights=durations), np.bincount(inverse)
+
+    report = {}
+    unique, seconds, counts = group(days)
+    report['days'] = _rollup([_day_key(int(day)) for day in unique], seconds, counts)
+    unique, seconds, counts = group(weeks)
+    report['weeks'] = _rollup([f"{int(week) // 100 + 1970:04d}-W{int(week) % 100:02d}" for week in unique], seconds, counts)
+    unique, seconds, counts = group(months)
+    report['months'] = _rollup([_month_key(int(month)) for month in unique], seconds, counts)
+    seconds = np.bincount(codes, weights=durations, minlength=len(projects))
+    counts = np.bincount(codes, minlength=len(projects))
+    report['projects'] = sorted(_rollup(projects, seconds, counts), key=lambda entry: entry['key'])
+    heatmap = np.bincount(weekdays * 24 + hours, weights=durations, minlength=7 * 24).reshape(7, 24)
+    report['heatmap'] = heatmap.tolist()
+    report['total'] = float(durations.sum())
+    return report
+
+def _report_python(starts, durations, codes, projects):
+    groups = {name: {} for name in ROLLUPS}
+    heatmap = [[0.0] * 24 for _ in range(7)]
+    for start, duration, code in zip(starts, durations, codes):
+        day = int(start // _SECONDS_PER_DAY)
+        weekday = (day + 3) % 7
+        hour = int((start - day * _SECONDS_PER_DAY) // 3600)
+        day_date = date.fromordinal(day + _EPOCH_ORDINAL)
+        keys = (
+            ('days', day_date.isoformat()),
+            ('weeks', _iso_week_key(day)),
+            ('months', f"{day_date.year:04d}-{day_date.month:02d}"),
+            ('projects', projects[code]),
+        )
+        for name, key in keys:
+            entry = groups[name].setdefault(key, [0.0, 0])
+            entry[0] += duration
+            entry[1] += 1
+        heatmap[weekday][hour] += duration
+
+    report = {}
+    for name in ROLLUPS:
+        items = sorted(groups[name].items())
+        report[name] = _rollup([key for key, _ in items], [entry[0] for _, entry in items], [entry[1] for _, entry in items])
+    report['heatmap'] = heatmap
+    report['total'] = float(sum(durations))
+    return report
+
+def build_report(sessions):
+    """
+    Roll up sessions (SessionRecords or dicts) into tracked seconds and session
+    counts by day, ISO week ('YYYY-Www'), month ('YYYY-MM') and project, plus a
+    7 x 24 heatmap of seconds by weekday (Monday first) and hour of day. A
+    session counts entirely towards the hour and day it started in; sessions
+    without a start time count from the start of their date.
+    Uses NumPy when it is installed and plain Python otherwise, with the same results.
+    """
+    starts, durations, codes, projects, undated = session_columns(sessions)
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None and starts:
+        report = _report_numpy(np, starts, durations, codes, projects)
+    else:
+        report = _report_python(starts, durations, codes, projects)
+    report['total'] += undated[0]
+    report['sessions'] = len(starts) + undated[1]
+    return report
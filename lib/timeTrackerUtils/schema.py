@@ -0,0 +1,55 @@
+# Layout version of the time data, {"timeTracker": {"version": N, "sessions": [...]}}.
+# Version 1 (no "version" key) mixed two session formats: full records written by
+# TimeTracker and {date, times} day entries written by the palette and rebuilt from
+# the sequential Time1..TimeN parameters. Version 2 holds only full records with
+# unique integer ids: {id, date, start_time, end_time, duration, project_path, notes}.
+# Day entries become one record per time, without start or end time.
+SCHEMA_VERSION = 2
+
+def schema_version(data):
+    """Version of time data, 1 if it predates versioning."""
+    try:
+        return data['timeTracker'].get('version', 1)
+    except (KeyError, TypeError, AttributeError):
+        return 1
+
+def is_current(data):
+    """Whether time data needs no migration."""
+    return schema_version(data) >= SCHEMA_VERSION
+
+def migrate_time_data(data):
+    """
+    Return time data converted to the current version. Records are copied, not
+    modified. Existing ids are kept; sessions without an id, or repeating an
+    earlier one, get ids above the highest existing id.
+    """
+    tracker = data.get('timeTracker', {}) if isinstance(data, dict) else {}
+    sessions = [session for session in tracker.get('sessions', []) if isinstance(session, dict)]
+    next_id = max((session['id'] for session in sessions if isinstance(session.get('id'), int)), default=0) + 1
+    seen_ids = set()
+    migrated = []
+    for session in sessions:
+        if isinstance(session.get('times'), list) and 'duration' not in session:
+            # Day entry: one record per time
+            for seconds in session['times']:
+                if not isinstance(seconds, (int, float)):
+                    continue
+                migrated.append({
+                    'id': next_id,
+                    'date': session.get('date', ''),
+                    'start_time': None,
+                    'end_time': None,
+                    'duration': seconds,
+                    'project_path': '',
+                    'notes': ''
+                })
+                seen_ids.add(next_id)
+                next_id += 1
+            continue
+        record = dict(session)
+        if not isinstance(record.get('id'), int) or record['id'] in seen_ids:
+            record['id'] = next_id
+            next_id += 1
+        seen_ids.add(record['id'])
+        migrated.append(record)
+    return {'timeTracker': dict(tracker, version=SCHEMA_VERSION, sessions=migrated)}
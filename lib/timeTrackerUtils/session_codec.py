@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta
+
+# Packed format version, written as the first varint
+PACKED_VERSION = 1
+
+# Session fields the packed format can hold; sessions with other fields stay JSON
+PACKED_FIELDS = {'id', 'date', 'start_time', 'end_time', 'duration', 'project_path', 'notes'}
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def _read_varints(data, pos, count):
+    """Read count varints in one loop; returns (values, new position)."""
+    values = []
+    append = values.append
+    value = 0
+    shift = 0
+    while len(values) < count:
+        byte = data[pos]
+        pos += 1
+        if byte < 0x80:
+            append(value | (byte << shift))
+            value = 0
+            shift = 0
+        else:
+            value |= (byte & 0x7f) << shift
+            shift += 7
+    return values, pos
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def _unzigzag(value):
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+def _epoch_seconds(text):
+    """Whole seconds since 1970 for a naive ISO timestamp, or None if it cannot be packed."""
+    moment = datetime.fromisoformat(text)
+    if moment.tzinfo is not None:
+        return None
+    return int((moment - _EPOCH).total_seconds())
+
+def pack_sessions(sessions):
+    """
+    Pack full session records into a compact columnar byte string.
+
+    Columns are written one after another so similar values sit together:
+    ids and start times as zigzag deltas, end times as offsets from the start,
+    durations as whole seconds, and date, project path and notes as indexes
+    into a string table. Timestamps and durations are rounded to whole seconds.
+    Returns None if a session does not fit the format (unknown fields, missing
+    start time, time zone offsets), in which case the caller should keep JSON.
+    """
+    strings = {}
+    ids, starts, ends, durations, dates, paths, notes = [], [], [], [], [], [], []
+    try:
+        for session in sessions:
+            if not isinstance(session, dict) or not set(session) <= PACKED_FIELDS:
+                return None
+            session_id = session.get('id')
+            if not isinstance(session_id, int) or session_id < 0:
+                return None
+            start = _epoch_seconds(session['start_time'])
+            if start is None:
+                return None
+            # 0 stands for a missing end time or duration (session still running)
+            end = 0
+            if session.get('end_time'):
+                end_seconds = _epoch_seconds(session['end_time'])
+                if end_seconds is None or end_seconds < start:
+                    return None
+                end = end_seconds - start + 1
+            duration = 0
+            if session.get('duration') is not None:
+                if session['duration'] < 0:
+                    return None
+                duration = int(round(session['duration'])) + 1
+            columns = (session.get('date', ''), session.get('project_path', ''), session.get('notes', ''))
+            if not all(isinstance(value, str) for value in columns):
+                return None
+
+            ids.append(session_id)
+            starts.append(start)
+            ends.append(end)
+            durations.append(duration)
+            dates.append(strings.setdefault(columns[0], len(strings)))
+            paths.append(strings.setdefault(columns[1], len(strings)))
+            notes.append(strings.setdefault(columns[2], len(strings)))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    out = bytearray()
+    _write_varint(out, PACKED_VERSION)
+    _write_varint(out, len(strings))
+    for text in strings:
+        encoded = text.encode('utf-8')
+        _write_varint(out, len(encoded))
+        out += encoded
+    _write_varint(out, len(ids))
+    for column in (ids, starts):
+        previous = 0
+        for value in column:
+            _write_varint(out, _zigzag(value - previous))
+            previous = value
+    for column in (ends, durations, dates, paths, notes):
+        for value in column:
+            _write_varint(out, value)
+    return bytes(out)
+
+def unpack_sessions(data):
+    """
+    Rebuild session records from pack_sessions() output.
+    Raises ValueError if the data is truncated or has an unknown version.
+    """
+    try:
+        version, pos = _read_varint(data, 0)
+        if version != PACKED_VERSION:
+            raise ValueError(f"Unknown packed session version {version}")
+
+        string_count, pos = _read_varint(data, pos)
+        strings = []
+        for _ in range(string_count):
+            length, pos = _read_varint(data, pos)
+            strings.append(data[pos:pos + length].decode('utf-8'))
+            pos += length
+
+        count, pos = _read_varint(data, pos)
+        values, pos = _read_varints(data, pos, count * 7)
+        columns = [values[i * count:(i + 1) * count] for i in range(7)]
+        # Ids and start times are deltas from the previous row
+        for column in columns[:2]:
+            previous = 0
+            for i, value in enumerate(column):
+                previous += _unzigzag(value)
+                column[i] = previous
+
+        sessions = []
+        append = sessions.append
+        for session_id, start, end, duration, date, path, note in zip(*columns):
+            start_time = _EPOCH + timedelta(seconds=start)
+            append({
+                'id': session_id,
+                'date': strings[date],
+                'start_time': start_time.isoformat(),
+                'end_time': (start_time + timedelta(seconds=end - 1)).isoformat() if end else None,
+                'duration': float(duration - 1) if duration else None,
+                'project_path': strings[path],
+                'notes': strings[note]
+            })
+        return sessions
+    except IndexError:
+        raise ValueError("Packed session data is truncated")
@@ -0,0 +1,112 @@
+import csv
+import json
+import os
+from itertools import islice
+
+# Exported columns: (heading, session field)
+EXPORT_COLUMNS = (
+    ('Date', 'date'),
+    ('Start Time', 'start_time'),
+    ('End Time', 'end_time'),
+    ('Duration (seconds)', 'duration'),
+    ('Project', 'project_path'),
+    ('Notes', 'notes'),
+)
+
+# Rows handed to the writer at a time, and the file buffer size
+CHUNK_ROWS = 500
+BUFFER_SIZE = 64 * 1024
+
+class _JsonLinesWriter:
+    """One JSON object per row, keyed by session field."""
+
+    def __init__(self, f):
+        self.f = f
+        self.fields = [field for heading, field in EXPORT_COLUMNS]
+
+    def writeheader(self):
+        pass
+
+    def writerows(self, rows):
+        self.f.write(''.join(json.dumps(dict(zip(self.fields, row))) + '\n' for row in rows))
+
+class _MarkdownWriter:
+    """A Markdown table."""
+
+    def __init__(self, f):
+        self.f = f
+
+    @staticmethod
+    def _cell(value):
+        if value is None:
+            return ''
+        return str(value).replace('|', '\\|').replace('\r', ' ').replace('\n', ' ')
+
+    def writeheader(self):
+        headings = [heading for heading, field in EXPORT_COLUMNS]
+        self.f.write('| ' + ' | '.join(headings) + ' |\n')
+        self.f.write('|' + '|'.join('---' for _ in headings) + '|\n')
+
+    def writerows(self, rows):
+        self.f.write(''.join('| ' + ' | '.join(self._cell(value) for value in row) + ' |\n' for row in rows))
+
+class _DelimitedWriter:
+    """CSV or TSV through the csv module."""
+
+    def __init__(self, f, dialect):
+        self.writer = csv.writer(f, dialect=dialect)
+
+    def writeheader(self):
+        self.writer.writerow([heading for heading, field in EXPORT_COLUMNS])
+
+    def writerows(self, rows):
+        self.writer.writerows(rows)
+
+EXPORT_FORMATS = {
+    'csv': lambda f: _DelimitedWriter(f, 'excel'),
+    'tsv': lambda f: _DelimitedWriter(f, 'excel-tab'),
+    'jsonl': _JsonLinesWriter,
+    'md': _MarkdownWriter,
+}
+
+# File extensions that name a format other than themselves
+_EXTENSIONS = {'txt': 'tsv', 'json': 'jsonl', 'markdown': 'md'}
+
+def export_format(file_path):
+    """Export format for a file name, by extension; CSV if the extension is unknown."""
+    extension = os.path.splitext(file_path)[1].lstrip('.').lower()
+    extension = _EXTENSIONS.get(extension, extension)
+    return extension if extension in EXPORT_FORMATS else 'csv'
+
+def session_rows(sessions):
+    """Yield one tuple of column values per session (SessionRecord or dict)."""
+    fields = [field for heading, field in EXPORT_COLUMNS]
+    for session in sessions:
+        yield tuple(session.get(field) for field in fields)
+
+def export_sessions(sessions, file_path, fmt=None, progress=None):
+    """
+    Write sessions to file_path as CSV, TSV, JSON lines or a Markdown table
+    (fmt, or chosen from the file extension). Rows are produced lazily and
+    written CHUNK_ROWS at a time, so sessions can be any iterable and memory
+    use does not grow with its length. progress(rows written so far) is
+    called after each chunk. Returns the number of rows written.
+    """
+    fmt = fmt or export_format(file_path)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'")
+
+    count = 0
+    with open(file_path, 'w', newline='', encoding='utf-8', buffering=BUFFER_SIZE) as f:
+        writer = EXPORT_FORMATS[fmt](f)
+        writer.writeheader()
+        rows = session_rows(sessions)
+        while True:
+            chunk = list(islice(rows, CHUNK_ROWS))
+            if not chunk:
+                break
+            writer.writerows(chunk)
+            count += len(chunk)
+            if progress:
+                progress(count)
+    return count
@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta
+
+# Naive timestamps are counted from this wall-clock epoch, as in session_codec
+_EPOCH = datetime(1970, 1, 1)
+
+def to_seconds(moment):
+    """Seconds since 1970 for a datetime, ignoring any time zone offset."""
+    return (moment.replace(tzinfo=None) - _EPOCH).total_seconds()
+
+def from_seconds(seconds):
+    """Naive datetime for seconds since 1970."""
+    return _EPOCH + timedelta(seconds=seconds)
+
+def now_seconds():
+    """Seconds since 1970 for the current local time."""
+    return to_seconds(datetime.now())
+
+def _parse_seconds(text):
+    try:
+        return to_seconds(datetime.fromisoformat(text))
+    except (TypeError, ValueError):
+        return None
+
+class SessionRecord:
+    """
+    One tracked session, stored in slots instead of a dict.
+
+    Start and end are kept as epoch seconds (start, end) and as ISO strings
+    (start_time, end_time); whichever form a record was created from is kept
+    and the other is only computed the first time it is asked for, so loading
+    and saving history does not parse or format timestamps. Fields beyond the
+    standard seven are kept in extra so to_dict() returns what from_dict() got.
+    Read access by key (record['notes'], record.get('date')) works as for the
+    dict records used before.
+    """
+
+    FIELDS = ('id', 'date', 'start_time', 'end_time', 'duration', 'project_path', 'notes')
+
+    __slots__ = ('id', 'date', 'duration', 'project_path', 'notes', 'extra',
+                 '_start', '_start_text', '_end', '_end_text')
+
+    def __init__(self, id=None, date='', start=None, end=None, duration=None, project_path='', notes='',
+                 start_time=None, end_time=None, extra=None):
+        self.id = id
+        self.date = date
+        self.duration = duration
+        self.project_path = project_path
+        self.notes = notes
+        self.extra = extra
+        self._start = start
+        self._start_text = start_time
+        self._end = end
+        self._end_text = end_time
+
+    @classmethod
+    def from_dict(cls, session):
+        """Build a record from a session dict; timestamps are parsed later if at all."""
+        extra = {key: value for key, value in session.items() if key not in cls.FIELDS} or None
+        return cls(
+            id=session.get('id'),
+            date=session.get('date', ''),
+            duration=session.get('duration'),
+            project_path=session.get('project_path', ''),
+            notes=session.get('notes', ''),
+            start_time=session.get('start_time'),
+            end_time=session.get('end_time'),
+            extra=extra
+        )
+
+    def to_dict(self):
+        """The session as the dict stored by the backends and sent to the palette."""
+        session = {
+            'id': self.id,
+            'date': self.date,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'duration': self.duration,
+            'project_path': self.project_path,
+            'notes': self.notes
+        }
+        if self.extra:
+            session.update(self.extra)
+        return session
+
+    def replace(self, **changes):
+        """
+        Return a copy with some fields changed. Besides the dict keys, start and
+        end may be given as epoch seconds; setting either form of a timestamp
+        drops the other so it is recomputed.
+        """
+        record = SessionRecord(self.id, self.date, self._start, self._end, self.duration, self.project_path,
+                               self.notes, self._start_text, self._end_text, dict(self.extra) if self.extra else None)
+        for key, value in changes.items():
+            if key in ('start', 'start_time'):
+                record._start, record._start_text = (value, None) if key == 'start' else (None, value)
+            elif key in ('end', 'end_time'):
+                record._end, record._end_text = (value, None) if key == 'end' else (None, value)
+            elif key in self.FIELDS:
+                setattr(record, key, value)
+            else:
+                record.extra = dict(record.extra or {}, **{key: value})
+        return record
+
+    @property
+    def start(self):
+        if self._start is None and self._start_text:
+            self._start = _parse_seconds(self._start_text)
+        return self._start
+
+    @property
+    def end(self):
+        if self._end is None and self._end_text:
+            self._end = _parse_seconds(self._end_text)
+        return self._end
+
+    @property
+    def start_time(self):
+        if self._start_text is None and self._start is not None:
+            self._start_text = from_seconds(self._start).isoformat()
+        return self._start_text
+
+    @property
+    def end_time(self):
+        if self._end_text is None and self._end is not None:
+            self._end_text = from_seconds(self._end).isoformat()
+        return self._end_text
+
+    @property
+    def start_datetime(self):
+        return from_seconds(self.start) if self.start is not None else None
+
+    @property
+    def end_datetime(self):
+        return from_seconds(self.end) if self.end is not None else None
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.FIELDS or bool(self.extra and key in self.extra)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, SessionRecord):
+            return self.to_dict() == other.to_dict()
+        return NotImplemented
+
+    def __repr__(self):
+        return f"SessionRecord({self.to_dict()!r})"
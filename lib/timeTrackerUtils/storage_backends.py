@@ -0,0 +1,435 @@
+import json
+import os
+import traceback
+import sys
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+# Add the lib directory to path if needed
+current_dir = os.path.dirname(os.path.abspath(__file__))
+lib_dir = os.path.abspath(os.path.join(current_dir, '..'))
+if lib_dir not in sys.path:
+    sys.path.append(lib_dir)
+
+from fusionAddInUtils import log_info, log_debug, log_warning, log_error
+from .parameter_storage import ParameterStorage
+from .write_behind import WriteBehindQueue
+from .schema import SCHEMA_VERSION
+
+# Local data folder of the add-in (sessions.json, settings.json, sessions.db)
+DATA_DIR = os.path.abspath(os.path.join(current_dir, '..', '..', 'data'))
+
+# Per-install settings file, e.g. {"storage_backend": "sqlite", "save_with_document": true}
+SETTINGS_FILE = os.path.join(DATA_DIR, 'settings.json')
+DEFAULT_BACKEND = 'parameters'
+
+# Next session id per backend scope, so ids are never handed out twice
+ID_COUNTER_FILE = os.path.join(DATA_DIR, 'session_ids.json')
+
+class StorageBackend(ABC):
+    """
+    Where TimeTracker keeps its session records.
+    Sessions are full records (id, date, start_time, end_time, duration,
+    project_path, notes); dates are compared as 'YYYY-MM-DD' strings.
+    """
+
+    name = ''
+
+    @abstractmethod
+    def load(self):
+        """Return all session records of the active document."""
+
+    @abstractmethod
+    def save(self, sessions):
+        """Replace all session records of the active document. Returns True on success."""
+
+    @abstractmethod
+    def update(self, session):
+        """Store a new or changed session record, matched by id. Returns True on success."""
+
+    def query_range(self, start_date, end_date):
+        """
+        Return the session records dated from start_date through end_date, e.g.
+        the sessions of the day the palette shows. Backends that can select by
+        date without loading everything override this.
+        """
+        return [
+            session for session in self.load()
+            if start_date <= session.get('date', '') <= end_date
+        ]
+
+    def flush(self):
+        """Make sure everything written so far is stored."""
+        return True
+
+    def generation(self):
+        """
+        Return a token that changes when the stored sessions may have changed, so
+        callers can keep a loaded copy until it does. The default never matches.
+        """
+        return object()
+
+    def scope(self):
+        """Return a key naming the set of sessions load() currently returns."""
+        return self.name
+
+def _file_generation(path):
+    """Modification time and size of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+class ParameterBackend(StorageBackend):
+    """Session records in the user parameters of the active document."""
+
+    name = 'parameters'
+
+    def load(self):
+        data = ParameterStorage.retrieve_time_data()
+        return data.get('timeTracker', {}).get('sessions', [])
+
+    def save(self, sessions):
+        return ParameterStorage.store_time_data({'timeTracker': {'version': SCHEMA_VERSION, 'sessions': sessions}})
+
+    def update(self, session):
+        # One journal record instead of a rewrite of the history
+        return ParameterStorage.append_time_session(dict(session))
+
+    def query_range(self, start_date, end_date):
+        # Only the monthly shards covering the range are read
+        months = []
+        year, month = int(start_date[:4]), int(start_date[5:7])
+        while f"{year:04d}-{month:02d}" <= end_date[:7]:
+            months.append(f"{year:04d}-{month:02d}")
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        data = ParameterStorage.retrieve_time_data_months(months)
+        return [
+            session for session in data['timeTracker']['sessions']
+            if start_date <= session.get('date', '') <= end_date
+        ]
+
+    def flush(self):
+        return WriteBehindQueue.flush()
+
+    def generation(self):
+        return ParameterStorage.get_data_generation()
+
+    def scope(self):
+        return f"{self.name}:{ParameterStorage.get_data_generation()[0]}"
+
+class JsonFileBackend(StorageBackend):
+    """Session records in a local JSON file, shared by all documents."""
+
+    name = 'json'
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DATA_DIR, 'sessions.json')
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def save(self, sessions):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump(sessions, f)
+        return True
+
+    def update(self, session):
+        sessions = self.load()
+        for i, existing in enumerate(sessions):
+            if existing.get('id') == session.get('id'):
+                sessions[i] = session
+                break
+        else:
+            sessions.append(session)
+        return self.save(sessions)
+
+    def generation(self):
+        return _file_generation(self.path)
+
+    def scope(self):
+        return f"{self.name}:{self.path}"
+
+@contextmanager
+def _file_lock(path):
+    """Hold an advisory lock on path (created if needed) for the duration of the block."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a+b') as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+class JsonlLogBackend(StorageBackend):
+    """
+    Session records in an append-only JSON Lines log, shared by all documents.
+    Every new or changed record is appended as one line and the last line for an
+    id wins, so a write costs the same however long the history is. Writers
+    serialize on an advisory lock file, and the data is fsynced every
+    FSYNC_BATCH appends and on flush(). A line cut short by a crash is skipped
+    on load. Once the log holds COMPACT_RATIO times more lines than live
+    records, it is rewritten to a temporary file and renamed over the log.
+    """
+
+    name = 'jsonl'
+
+    FSYNC_BATCH = 8
+    COMPACT_RATIO = 2
+    COMPACT_MIN_LINES = 200
+
+    def __init__(self, path=None, legacy_path=None):
+        self.path = path or os.path.join(DATA_DIR, 'sessions.jsonl')
+        self.lock_path = self.path + '.lock'
+        # Sessions saved with json.dump before the log existed
+        self.legacy_path = legacy_path or os.path.join(os.path.dirname(self.path), 'sessions.json')
+        self._unsynced = 0
+        self._line_count = 0
+        self._record_count = 0
+
+    def _read_records(self):
+        """Stream the log into records by id, in first-written order."""
+        records = {}
+        unkeyed = []
+        lines = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    log_warning(f"Skipping damaged line {lines} in {self.path}")
+                    continue
+                if 'id' in record:
+                    records[record['id']] = record
+                else:
+                    unkeyed.append(record)
+        self._line_count = lines
+        self._record_count = len(records) + len(unkeyed)
+        return list(records.values()) + unkeyed
+
+    def load(self):
+        with _file_lock(self.lock_path):
+            if os.path.exists(self.path):
+                return self._read_records()
+            if os.path.exists(self.legacy_path):
+                return JsonFileBackend(self.legacy_path).load()
+            return []
+
+    def _rewrite(self, sessions):
+        """Atomically replace the log with one line per record."""
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for session in sessions:
+                f.write(json.dumps(session, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._unsynced = 0
+        self._line_count = self._record_count = len(sessions)
+
+    def save(self, sessions):
+        with _file_lock(self.lock_path):
+            self._rewrite(sessions)
+        return True
+
+    def update(self, session):
+        line = json.dumps(session, separators=(',', ':')) + '\n'
+        with _file_lock(self.lock_path):
+            if not os.path.exists(self.path) and os.path.exists(self.legacy_path):
+                # Start the log from the old JSON file so its sessions carry over
+                self._rewrite(JsonFileBackend(self.legacy_path).load())
+            with open(self.path, 'a+b') as f:
+                # Terminate a line left unfinished by a crash before appending
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        f.write(b'\n')
+                f.write(line.encode('utf-8'))
+                f.flush()
+                self._unsynced += 1
+                if self._unsynced >= self.FSYNC_BATCH:
+                    os.fsync(f.fileno())
+                    self._unsynced = 0
+            self._line_count += 1
+            
+            if self._line_count >= self.COMPACT_MIN_LINES and self._line_count > self.COMPACT_RATIO * self._record_count:
+                # The counts may be stale if another instance wrote; reading them again settles that
+                records = self._read_records()
+                if self._line_count > self.COMPACT_RATIO * self._record_count:
+                    log_info(f"Compacting {self.path}: {self._line_count} lines, {self._record_count} records")
+                    self._rewrite(records)
+        return True
+
+    def generation(self):
+        return (_file_generation(self.path), _file_generation(self.legacy_path))
+
+    def scope(self):
+        return f"{self.name}:{self.path}"
+
+    def flush(self):
+        if self._unsynced and os.path.exists(self.path):
+            with _file_lock(self.lock_path):
+                with open(self.path, 'a') as f:
+                    os.fsync(f.fileno())
+            self._unsynced = 0
+        return True
+
+class SqliteBackend(StorageBackend):
+    """
+    Session records in a local SQLite database, one row per session keyed by
+    document and session id, with an index on (document, date) for range queries.
+    Nothing is written to the document, so large histories skip the parameter
+    round-trip entirely.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path=None):
+        import sqlite3
+        self.path = path or os.path.join(DATA_DIR, 'sessions.db')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            ' doc_key TEXT NOT NULL, id INTEGER NOT NULL, date TEXT, record TEXT NOT NULL,'
+            ' PRIMARY KEY (doc_key, id))'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS sessions_by_date ON sessions (doc_key, date)')
+        self.connection.commit()
+        # Commits made through this connection, which data_version does not count
+        self._writes = 0
+
+    def _doc_key(self):
+        design = ParameterStorage.get_active_document()
+        return ParameterStorage.get_document_key(design) if design else ''
+
+    def _row(self, doc_key, session):
+        return (doc_key, session['id'], session.get('date', ''), json.dumps(session, separators=(',', ':')))
+
+    def load(self):
+        rows = self.connection.execute(
+            'SELECT record FROM sessions WHERE doc_key = ? ORDER BY id', (self._doc_key(),)
+        )
+        return [json.loads(record) for (record,) in rows]
+
+    def save(self, sessions):
+        doc_key = self._doc_key()
+        with self.connection:
+            self.connection.execute('DELETE FROM sessions WHERE doc_key = ?', (doc_key,))
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)',
+                [self._row(doc_key, session) for session in sessions if 'id' in session]
+            )
+        self._writes += 1
+        return True
+
+    def update(self, session):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)', self._row(self._doc_key(), session))
+        self._writes += 1
+        return True
+
+    def query_range(self, start_date, end_date):
+        rows = self.connection.execute(
+            'SELECT record FROM sessions WHERE doc_key = ? AND date BETWEEN ? AND ? ORDER BY id',
+            (self._doc_key(), start_date, end_date)
+        )
+        return [json.loads(record) for (record,) in rows]
+
+    def flush(self):
+        self.connection.commit()
+        return True
+
+    def generation(self):
+        # data_version changes when another connection commits to the database
+        data_version = self.connection.execute('PRAGMA data_version').fetchone()[0]
+        return (self._doc_key(), data_version, self._writes)
+
+    def scope(self):
+        return f"{self.name}:{self.path}:{self._doc_key()}"
+
+BACKENDS = {
+    ParameterBackend.name: ParameterBackend,
+    JsonFileBackend.name: JsonFileBackend,
+    JsonlLogBackend.name: JsonlLogBackend,
+    SqliteBackend.name: SqliteBackend,
+}
+
+def load_settings():
+    """Return the per-install settings, or an empty dict if there are none."""
+    try:
+        if os.path.exists(SETTINGS_FILE):
+            with open(SETTINGS_FILE, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        log_warning(f"Could not read storage settings: {str(e)}")
+    return {}
+
+def load_id_counter(scope):
+    """Return the next session id recorded for a backend scope, or 0 if none is."""
+    try:
+        if os.path.exists(ID_COUNTER_FILE):
+            with open(ID_COUNTER_FILE, 'r') as f:
+                return json.load(f).get(scope, 0)
+    except Exception as e:
+        log_warning(f"Could not read session id counter: {str(e)}")
+    return 0
+
+def save_id_counter(scope, next_id):
+    """Record the next session id for a backend scope."""
+    try:
+        with _file_lock(ID_COUNTER_FILE + '.lock'):
+            counters = {}
+            if os.path.exists(ID_COUNTER_FILE):
+                with open(ID_COUNTER_FILE, 'r') as f:
+                    counters = json.load(f)
+            # Another instance may have counted further already
+            counters[scope] = max(counters.get(scope, 0), next_id)
+            with open(ID_COUNTER_FILE + '.tmp', 'w') as f:
+                json.dump(counters, f)
+            os.replace(ID_COUNTER_FILE + '.tmp', ID_COUNTER_FILE)
+        return True
+    except Exception as e:
+        log_warning(f"Could not save session id counter: {str(e)}")
+        return False
+
+def get_backend(name=None):
+    """
+    Create the storage backend named in the settings file (or the given name).
+    Falls back to document parameters if the backend is unknown or fails to open.
+    """
+    if name is None:
+        name = load_settings().get('storage_backend', DEFAULT_BACKEND)
+
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        log_warning(f"Unknown storage backend '{name}', using {DEFAULT_BACKEND}")
+        backend_class = BACKENDS[DEFAULT_BACKEND]
+    try:
+        backend = backend_class()
+    except Exception as e:
+        log_error(f"Failed to open storage backend '{name}': {str(e)}")
+        log_debug(f"Traceback: {traceback.format_exc()}")
+        backend = ParameterBackend()
+    log_info(f"Using {backend.name} storage backend")
+    return backend
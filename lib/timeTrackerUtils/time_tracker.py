@@ -1,115 +1,226 @@
 import os
-import json
-from datetime import datetime
-from .parameter_storage import ParameterStorage
+from bisect import bisect_left, insort
+from datetime import datetime, date, timedelta
+from .storage_backends import get_backend, JsonlLogBackend, load_id_counter, save_id_counter
+from .session_record import SessionRecord, to_seconds, now_seconds
+from .session_export import export_sessions
+from .export_worker import ExportWorker
+from .reports import build_report
 
 class TimeTracker:
-    def __init__(self):
+    """
+    Session state for the timer. self.sessions is authoritative: reads are
+    answered from memory and storage is only read again when the backend's
+    generation token shows a change made elsewhere (the palette, another
+    document, another Fusion instance). self.generation counts changes to
+    self.sessions, for callers that cache anything derived from it.
+
+    Sessions are held as SessionRecord objects and converted to dicts only
+    when they are written. Totals are kept as running aggregates (overall, per
+    day and per project, with session counts) that are rebuilt on load and
+    adjusted as sessions are added, stopped or edited, so querying them does
+    not depend on history length. Sessions are found by id through an
+    id -> list position index, and new ids come from a counter persisted per
+    backend scope (see save_id_counter). Time range queries use a list of
+    sessions sorted by start time, built on the first query.
+    """
+
+    def __init__(self, backend=None):
         self.current_session = None
         self.sessions = []
+        self.generation = 0
+        self._storage_generation = None
+        # Aggregates: total seconds and session counts, overall and keyed by date / project path
+        self._total = 0.0
+        self._session_count = 0
+        self._day_totals = {}
+        self._project_totals = {}
+        # Session id -> position in self.sessions, and the next id to hand out
+        self._positions = {}
+        self._next_id = 1
+        self._id_scope = None
+        # Sorted (start seconds, id) pairs for query(); None until first needed
+        self._time_index = None
+        # (generation, report) of the last full-history get_report()
+        self._report = None
+        # Document parameters unless another backend is selected in data/settings.json
+        self.backend = backend or get_backend()
         # Keep the data_file path for backward compatibility
         self.data_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'sessions.json')
+        # Local session log used when the backend fails; starts from data_file if that exists
+        self.fallback = JsonlLogBackend(os.path.join(os.path.dirname(self.data_file), 'sessions.jsonl'), self.data_file)
         self._load_sessions()
 
+    def _refresh(self):
+        """Reload sessions if storage changed since they were loaded or written."""
+        try:
+            if self.backend.generation() == self._storage_generation:
+                return
+        except Exception as e:
+            print(f"Error checking storage generation: {str(e)}")
+        self._load_sessions()
+
+    def _mark_synced(self):
+        """Record that self.sessions changed and now matches storage."""
+        self.generation += 1
+        try:
+            self._storage_generation = self.backend.generation()
+        except Exception:
+            self._storage_generation = None
+
     def _load_sessions(self):
+        # Taken before loading, so a write racing the load causes another reload
+        self._mark_synced()
         try:
-            # First try to load from parameters
-            param_data = ParameterStorage.retrieve_time_data()
-            if param_data and 'timeTracker' in param_data:
-                data = param_data['timeTracker']
-                if 'sessions' in data:
-                    loaded_sessions = data.get('sessions', [])
-                    # Validate and convert the session format if needed
-                    self.sessions = self._ensure_compatible_session_format(loaded_sessions)
-                    return
-            
-            # Fall back to file-based loading if parameters didn't work
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    self.sessions = json.load(f)
+            self.sessions = self._to_records(self.backend.load())
         except Exception as e:
-            print(f"Error loading sessions: {str(e)}")
-            self.sessions = []
+            print(f"Error loading sessions from {self.backend.name} backend: {str(e)}")
+            try:
+                # Fall back to file-based loading if the backend didn't work
+                self.sessions = self._to_records(self.fallback.load())
+            except Exception as e:
+                print(f"Error loading sessions: {str(e)}")
+                self.sessions = []
+        self._rebuild_indexes()
+
+    def _to_records(self, sessions):
+        """Convert loaded session dicts to SessionRecords; backends return the current schema."""
+        return [SessionRecord.from_dict(session) for session in sessions]
+
+    def _rebuild_indexes(self):
+        """Recompute the aggregates, the id index and the id counter from self.sessions."""
+        self._total = 0.0
+        self._session_count = 0
+        self._day_totals = {}
+        self._project_totals = {}
+        self._positions = {}
+        self._time_index = None
+        max_id = 0
+        for position, session in enumerate(self.sessions):
+            self._aggregate(session, 1)
+            self._positions[session.id] = position
+            if isinstance(session.id, int) and session.id > max_id:
+                max_id = session.id
+        try:
+            self._id_scope = self.backend.scope()
+            self._next_id = max(max_id + 1, load_id_counter(self._id_scope))
+        except Exception as e:
+            print(f"Error reading session id counter: {str(e)}")
+            self._id_scope = None
+            self._next_id = max_id + 1
+
+    def _aggregate(self, session, sign):
+        """Add (sign=1) or remove (sign=-1) one session's contribution to the aggregates."""
+        duration = session.duration or 0
+        self._total += sign * duration
+        self._session_count += sign
+        for totals, key in ((self._day_totals, session.date), (self._project_totals, session.project_path)):
+            entry = totals.setdefault(key, [0.0, 0])
+            entry[0] += sign * duration
+            entry[1] += sign
+            if entry[1] <= 0:
+                del totals[key]
+
+    def _replace_session(self, session):
+        """Put session in place of the record with the same id (or append it), keeping aggregates current."""
+        position = self._positions.get(session.id)
+        if position is not None:
+            self._aggregate(self.sessions[position], -1)
+            self._unindex_time(self.sessions[position])
+            self.sessions[position] = session
+        else:
+            self._positions[session.id] = len(self.sessions)
+            self.sessions.append(session)
+        self._aggregate(session, 1)
+        if self._time_index is not None:
+            insort(self._time_index, (self._time_key(session), session.id))
+
+    @staticmethod
+    def _time_key(session):
+        """Position of a session in the time index: its start, or the start of its date."""
+        if session.start is not None:
+            return session.start
+        try:
+            return to_seconds(datetime.strptime(session.date, '%Y-%m-%d'))
+        except (TypeError, ValueError):
+            return float('-inf')
 
-    def _ensure_compatible_session_format(self, sessions):
+    def _unindex_time(self, session):
+        if self._time_index is None:
+            return
+        entry = (self._time_key(session), session.id)
+        i = bisect_left(self._time_index, entry)
+        if i < len(self._time_index) and self._time_index[i] == entry:
+            del self._time_index[i]
+
+    @staticmethod
+    def _query_bound(value, end=False):
+        """
+        Seconds for a query bound: a datetime, a date or 'YYYY-MM-DD' (the start
+        of that day, or the end of it for an end bound), an ISO timestamp, or
+        epoch seconds. None is unbounded.
         """
-        Ensures that loaded sessions match the expected format.
-        Converts simplified formats (like {date, times} from sequential parameters)
-        to the full format expected by the HTML palette.
+        if value is None:
+            return float('inf') if end else float('-inf')
+        if isinstance(value, (int, float)):
+            return value
+        if isinstance(value, str):
+            value = date.fromisoformat(value) if len(value) == 10 else datetime.fromisoformat(value)
+        if not isinstance(value, datetime):
+            value = datetime(value.year, value.month, value.day) + timedelta(days=1 if end else 0)
+        return to_seconds(value)
+
+    def _save_session(self, session):
         """
+        Save one new or changed session without rewriting the others where the
+        backend allows; if the backend fails it goes to the local session log.
+        """
+        session = session.to_dict()
         try:
-            compatible_sessions = []
-            for session in sessions:
-                # Check if this is using the simplified format with just 'date' and 'times'
-                if 'date' in session and 'times' in session and 'id' not in session:
-                    # This is from sequential parameters - convert each time entry to a full session
-                    date = session['date']
-                    for i, duration in enumerate(session['times']):
-                        # Create a compatible session record
-                        compatible_sessions.append({
-                            'id': len(compatible_sessions) + 1,
-                            'date': date,
-                            'start_time': datetime.now().isoformat(),  # We don't have the actual time
-                            'end_time': datetime.now().isoformat(),    # We don't have the actual time
-                            'duration': duration,
-                            'project_path': 'Unknown',  # We don't have the project path
-                            'notes': f'Imported from sequential parameter {i+1}'
-                        })
-                else:
-                    # This is already in the expected format or close enough
-                    if 'id' not in session:
-                        session['id'] = len(compatible_sessions) + 1
-                    compatible_sessions.append(session)
-                    
-            return compatible_sessions
+            if self.backend.update(session):
+                self._mark_synced()
+                return True
         except Exception as e:
-            print(f"Error converting session format: {str(e)}")
-            return sessions  # Return original on error
-
-    def _save_sessions(self):
+            print(f"Error saving session to {self.backend.name} backend: {str(e)}")
+        self.generation += 1
+        # Fall back to appending to the local session log
         try:
-            # First try to save to parameters
-            success = ParameterStorage.store_time_data({
-                'timeTracker': {
-                    'sessions': self.sessions
-                }
-            })
-            
-            if not success:
-                # Fall back to file-based storage
-                os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-                with open(self.data_file, 'w') as f:
-                    json.dump(self.sessions, f)
-                    
-            return success
+            self.fallback.update(session)
         except Exception as e:
-            print(f"Error saving sessions: {str(e)}")
-            return False
+            print(f"Error saving session: {str(e)}")
+        return False
+
+    def flush(self):
+        """Make sure the session records written so far are stored, e.g. before the add-in stops."""
+        for backend in (self.backend, self.fallback):
+            try:
+                backend.flush()
+            except Exception as e:
+                print(f"Error flushing {backend.name} backend: {str(e)}")
 
     def start_timer(self, project_path):
         """Start a new timing session for the given project."""
         if not self.current_session:
             # Make sure we have the latest data before starting a new session
-            self._load_sessions()
+            self._refresh()
             
             # Create a new session with a unique ID
             session_id = self._generate_session_id()
             
-            self.current_session = {
-                'id': session_id,
-                'date': datetime.now().strftime('%Y-%m-%d'),
-                'start_time': datetime.now().isoformat(),
-                'end_time': None,
-                'duration': None,
-                'project_path': project_path,
-                'notes': ''
-            }
+            now = datetime.now()
+            self.current_session = SessionRecord(
+                id=session_id,
+                date=now.strftime('%Y-%m-%d'),
+                start=to_seconds(now),
+                start_time=now.isoformat(),
+                project_path=project_path
+            )
             
             # Add to sessions list
-            self.sessions.append(self.current_session)
+            self._replace_session(self.current_session)
             
             # Save immediately to ensure it's stored
-            self._save_sessions()
+            self._save_session(self.current_session)
             return True
         
         return False  # Session already running
@@ -119,22 +230,18 @@ class TimeTracker:
         if self.current_session:
             # Calculate end time and duration
             end_time = datetime.now()
-            start_time = datetime.fromisoformat(self.current_session['start_time'])
-            duration = (end_time - start_time).total_seconds()
+            duration = to_seconds(end_time) - self.current_session.start
             
-            # Update the current session with end time and duration
-            self.current_session['end_time'] = end_time.isoformat()
-            self.current_session['duration'] = duration
+            # Update a copy of the current session with end time and duration, so the
+            # stored record still shows it running when its aggregate is removed
+            self.current_session = self.current_session.replace(end_time=end_time.isoformat(), duration=duration)
             
             # Instead of modifying the session in place, find and replace it in the sessions list
             # This ensures we update the correct session even if the list was reloaded
-            for i, session in enumerate(self.sessions):
-                if session.get('id') == self.current_session['id']:
-                    self.sessions[i] = self.current_session
-                    break
+            self._replace_session(self.current_session)
             
-            # Save the updated sessions
-            success = self._save_sessions()
+            # Save the updated session
+            success = self._save_session(self.current_session)
             
             # Clear the current session
             self.current_session = None
@@ -143,74 +250,176 @@ class TimeTracker:
         
         return False  # No active session
 
+    def edit_session(self, session_id, **changes):
+        """
+        Change fields of a stored session, e.g. edit_session(3, notes='Review').
+        Returns False if there is no session with that id.
+        """
+        self._refresh()
+        position = self._positions.get(session_id)
+        if position is None:
+            return False
+        edited = self.sessions[position].replace(**changes)
+        edited.id = session_id
+        self._replace_session(edited)
+        if self.current_session and self.current_session.id == session_id:
+            self.current_session = edited
+        return self._save_session(edited)
+
+    def add_session(self, session):
+        """
+        Store a finished session recorded elsewhere (e.g. in the palette), given
+        as a session dict; it gets the next id. Returns the stored SessionRecord,
+        or None if the backend could not store it.
+        """
+        self._refresh()
+        record = SessionRecord.from_dict(session)
+        record.id = self._generate_session_id()
+        self._replace_session(record)
+        return record if self._save_session(record) else None
+
     def _generate_session_id(self):
         """Generate a unique session ID."""
-        # Get the highest existing ID
-        max_id = 0
-        for session in self.sessions:
-            if 'id' in session and session['id'] > max_id:
-                max_id = session['id']
-        
-        # Return the next ID in sequence
-        return max_id + 1
+        session_id = self._next_id
+        self._next_id += 1
+        # Persist the counter so the id is not reused, even if the session is lost
+        if self._id_scope is not None:
+            save_id_counter(self._id_scope, self._next_id)
+        return session_id
 
     def get_current_session_duration(self):
         """Get the duration of the current session in seconds."""
-        if self.current_session:
-            start_time = datetime.fromisoformat(self.current_session['start_time'])
-            duration = (datetime.now() - start_time).total_seconds()
-            return duration
+        if self.current_session and self.current_session.start is not None:
+            return now_seconds() - self.current_session.start
         return 0
 
+    def _running_duration(self, key=None, value=None):
+        """Seconds of the running session, if any (and if its key field equals value)."""
+        if not self.current_session or self.current_session.duration:
+            return 0
+        if key and getattr(self.current_session, key) != value:
+            return 0
+        return self.get_current_session_duration()
+
     def get_total_time(self):
         """Get the total time tracked across all sessions in seconds."""
-        total = 0
-        
-        # Ensure we have the latest data
-        self._load_sessions()
-        
-        # Sum all session durations
-        for session in self.sessions:
-            if 'duration' in session and session['duration']:
-                total += session['duration']
-            # Also include current session if it's not already counted
-            elif self.current_session and session.get('id') == self.current_session.get('id'):
-                total += self.get_current_session_duration()
-        
-        return total
+        # Pick up changes made elsewhere
+        self._refresh()
+        return self._total + self._running_duration()
+
+    def get_session_count(self):
+        """Get the number of sessions, including a running one."""
+        self._refresh()
+        return self._session_count
+
+    def get_day_total(self, date):
+        """Get the seconds tracked on a date ('YYYY-MM-DD')."""
+        self._refresh()
+        return self._day_totals.get(date, (0.0, 0))[0] + self._running_duration('date', date)
+
+    def get_project_total(self, project_path):
+        """Get the seconds tracked for a project."""
+        self._refresh()
+        return self._project_totals.get(project_path, (0.0, 0))[0] + self._running_duration('project_path', project_path)
+
+    def get_daily_totals(self):
+        """Get {date: {'duration': seconds, 'sessions': count}} for every date with sessions."""
+        self._refresh()
+        return {date: {'duration': seconds, 'sessions': count} for date, (seconds, count) in self._day_totals.items()}
+
+    def get_project_totals(self):
+        """Get {project path: {'duration': seconds, 'sessions': count}} for every project with sessions."""
+        self._refresh()
+        return {path: {'duration': seconds, 'sessions': count} for path, (seconds, count) in self._project_totals.items()}
 
     def get_session_history(self):
-        """Get the list of all session records."""
-        # Ensure we have the latest data
-        self._load_sessions()
+        """Get the list of all session records (SessionRecord; use to_dict() for the stored form)."""
+        # Pick up changes made elsewhere
+        self._refresh()
         return self.sessions
 
-    def export_to_csv(self, file_path):
-        """Export the session history to a CSV file."""
+    def query(self, start=None, end=None, project=None):
+        """
+        Get the sessions that started from start up to end, in start time order,
+        optionally only those of one project. Bounds are datetimes, dates,
+        'YYYY-MM-DD' strings (end includes that whole day), ISO timestamps or
+        epoch seconds; None leaves that side open. Sessions without a start time
+        count from the start of their date.
+        """
+        self._refresh()
+        if self._time_index is None:
+            self._time_index = sorted((self._time_key(session), session.id) for session in self.sessions)
+        index = self._time_index
+        low = bisect_left(index, (self._query_bound(start),))
+        high = bisect_left(index, (self._query_bound(end, end=True),), low)
+        sessions = [self.sessions[self._positions[session_id]] for _, session_id in index[low:high]]
+        if project is not None:
+            sessions = [session for session in sessions if session.project_path == project]
+        return sessions
+
+    def get_sessions_in_range(self, start_date, end_date):
+        """
+        Get the session records dated from start_date through end_date ('YYYY-MM-DD'),
+        the dates the daily totals use; query() selects by start time instead.
+        """
         try:
-            import pandas as pd
-            
-            # Ensure we have the latest data
-            self._load_sessions()
-            
-            # Format data for export
-            export_data = []
-            for session in self.sessions:
-                # Extract date, start time, end time, duration and notes
-                export_data.append({
-                    'Date': session.get('date', ''),
-                    'Start Time': session.get('start_time', ''),
-                    'End Time': session.get('end_time', ''),
-                    'Duration (seconds)': session.get('duration', 0),
-                    'Project': session.get('project_path', ''),
-                    'Notes': session.get('notes', '')
-                })
-            
-            # Create dataframe and export to CSV
-            df = pd.DataFrame(export_data)
-            df.to_csv(file_path, index=False)
+            return self._to_records(self.backend.query_range(start_date, end_date))
+        except Exception as e:
+            print(f"Error querying sessions: {str(e)}")
+            return []
+
+    def get_report(self, start=None, end=None, project=None):
+        """
+        Get rollups by day, ISO week, month and project and a weekday x hour
+        heatmap (see build_report) of the session history, or of the sessions
+        query() finds for the bounds given. The full-history report is kept
+        until the sessions change. A running session counts with no time.
+        """
+        try:
+            self._refresh()
+            if start is not None or end is not None or project is not None:
+                return build_report(self.query(start, end, project))
+            if self._report is None or self._report[0] != self.generation:
+                self._report = (self.generation, build_report(self.sessions))
+            return self._report[1]
+        except Exception as e:
+            print(f"Error building report: {str(e)}")
+            return None
+
+    def export(self, file_path, fmt=None, start=None, end=None, project=None):
+        """
+        Export the session history, or the sessions query() finds for the bounds
+        given, to a CSV, TSV, JSON lines or Markdown file (see export_sessions).
+        """
+        try:
+            # Pick up changes made elsewhere
+            self._refresh()
+            if start is None and end is None and project is None:
+                sessions = self.sessions
+            else:
+                sessions = self.query(start, end, project)
             
+            export_sessions(sessions, file_path, fmt)
             return True
         except Exception as e:
-            print(f"Error exporting to CSV: {str(e)}")
-            return False 
\ No newline at end of file
+            print(f"Error exporting sessions: {str(e)}")
+            return False
+
+    def export_in_background(self, file_path, fmt=None, start=None, end=None, project=None, notify=None):
+        """
+        Like export(), but only the list of sessions is copied here; the file is
+        written by ExportWorker, which reports to notify(message). Returns the
+        export id.
+        """
+        self._refresh()
+        if start is None and end is None and project is None:
+            snapshot = list(self.sessions)
+        else:
+            snapshot = self.query(start, end, project)
+        return ExportWorker.submit(
+            lambda progress: export_sessions(snapshot, file_path, fmt, progress), notify
+        )
+
+    def export_to_csv(self, file_path, start=None, end=None, project=None):
+        """Export the session history, or the sessions query() finds for the bounds given, to a CSV file."""
+        return self.export(file_path, 'csv', start, end, project)
@@ -13,6 +13,9 @@ if lib_dir not in sys.path:
     sys.path.append(lib_dir)
 
 from ..parameter_storage import ParameterStorage
+from ..schema import SCHEMA_VERSION
+from ..write_behind import WriteBehindQueue
+from ..export_worker import ExportWorker
 from fusionAddInUtils import log_info, log_debug, log_warning, log_error
 
 class PaletteClosedHandler(adsk.core.UserInterfaceGeneralEventHandler):
@@ -22,6 +25,8 @@ class PaletteClosedHandler(adsk.core.UserInterfaceGeneralEventHandler):
 
     def notify(self, args):
         try:
+            # Write anything still queued before the palette goes away
+            WriteBehindQueue.flush_idle()
             if self.window.palette:
                 self.window.palette.deleteMe()
                 self.window.palette = None
@@ -73,6 +78,22 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
                 elif action == 'saveTimeData':
                     self.handle_save_time_data(html_args)
                     
+                elif action == 'loadDay':
+                    # Sessions of the date selected in the palette
+                    self.handle_load_day(html_args)
+                    
+                elif action == 'addSession':
+                    # A session finished in the palette
+                    self.handle_add_session(html_args)
+                    
+                elif action == 'querySessions':
+                    # Sessions in a time range, e.g. for a weekly report
+                    self.handle_query_sessions(html_args)
+                    
+                elif action == 'getReport':
+                    # Day/week/month/project rollups and the weekday x hour heatmap
+                    self.handle_get_report(html_args)
+                    
                 elif action == 'getProjectInfo':
                     self.handle_project_info(html_args)
                 
@@ -251,6 +272,8 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
                     '', 
                     f'Test parameter created at {datetime.now().strftime("%H:%M:%S")}'
                 )
+                if test_param:
+                    ParameterStorage.get_parameter_index(design).added(param_name, test_param)
                 log_info(f"[{test_id}] Created parameter: {param_name}")
                 
             if test_param:
@@ -399,7 +422,7 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
                 self.send_response(args, {
                     "success": False,
                     "message": "No active document found",
-                    "timeData": {"timeTracker": {"sessions": []}}
+                    "summary": self.get_palette_summary(None)
                 })
                 return
             
@@ -407,59 +430,19 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
             project_info = self.window.get_project_info()
             log_debug(f"Project info: {project_info}")
             
-            # Debug available parameters
-            params = design.userParameters
-            log_info(f"Found {params.count} total parameters")
-            
-            # List all parameters for debugging
-            param_names = []
-            for i in range(params.count):
-                param = params.item(i)
-                param_names.append(f"{param.name} ({param.value})")
-            log_info(f"Parameters: {', '.join(param_names)}")
-            
-            # Get time parameters names
-            time_params = []
-            for i in range(params.count):
-                param = params.item(i)
-                if param.name == ParameterStorage.TIME_DATA_PARAM or param.name.startswith(ParameterStorage.TIME_PREFIX):
-                    time_params.append(param.name)
-            
-            if time_params:
-                log_info(f"Found time parameters: {', '.join(time_params)}")
-                # Retrieve time data from parameters
-                time_data = ParameterStorage.retrieve_time_data()
-            else:
-                log_warning("No time parameters found in document")
-                time_data = {"timeTracker": {"sessions": []}}
-            
-            # Always ensure we have a valid structure
-            if not time_data or not isinstance(time_data, dict):
-                log_warning("Invalid time data returned, using empty structure")
-                time_data = {"timeTracker": {"sessions": []}}
-                
-            if 'timeTracker' not in time_data:
-                log_warning("No timeTracker key in data, adding empty structure")
-                time_data['timeTracker'] = {"sessions": []}
-                
-            if 'sessions' not in time_data['timeTracker']:
-                log_warning("No sessions key in timeTracker data, adding empty array")
-                time_data['timeTracker']['sessions'] = []
-                
-            # If valid time data exists, log some debug info
-            session_count = len(time_data['timeTracker']['sessions'])
-            log_info(f"Retrieved time data with {session_count} sessions for palette load")
+            # Debug available parameters (from the cached parameter index)
+            index = ParameterStorage.get_parameter_index(design)
+            log_info(f"Found {index.count} total parameters")
+            log_debug(f"Parameters: {', '.join(index.names())}")
             
-            # Print detailed info about the time data
-            for i, session in enumerate(time_data['timeTracker']['sessions']):
-                log_info(f"Session {i+1}: Date: {session.get('date', 'unknown')}, Times count: {len(session.get('times', []))}")
-                if 'times' in session and len(session['times']) > 0:
-                    log_debug(f"  First time value: {session['times'][0]} seconds")
+            # Only the date list with daily totals; a day's sessions are sent by loadDay
+            summary = self.get_palette_summary(design)
+            log_info(f"Sending summary of {summary['sessions']} sessions on {len(summary['days'])} dates for palette load")
             
-            # Create a response with both project info and time data
+            # Create a response with both project info and the summary
             response = {
                 "success": True,
-                "timeData": time_data,
+                "summary": summary,
                 "projectInfo": project_info
             }
             
@@ -479,15 +462,81 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
             self.send_response(args, {
                 "success": False,
                 "message": f"Error loading palette data: {str(e)}",
-                "timeData": {"timeTracker": {"sessions": []}}
+                "summary": self.get_palette_summary(None)
             })
     
+    def uses_parameter_storage(self):
+        """
+        Whether sessions are stored in document parameters, which the palette
+        reads directly. Other backends are read through the time tracker.
+        """
+        return self.window.time_tracker.backend.name == 'parameters'
+    
+    @staticmethod
+    def is_date(value):
+        """Whether a session date is a 'YYYY-MM-DD' date."""
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+            return True
+        except (TypeError, ValueError):
+            return False
+    
+    def get_palette_summary(self, design):
+        """
+        The palette's view of the time summary: dates with their totals in
+        ascending order, the totals of sessions without a date, the overall
+        total and session count, and the last date.
+        """
+        if not self.uses_parameter_storage():
+            return self.get_tracker_summary()
+        summary = ParameterStorage.get_time_summary(design)
+        days = ParameterStorage.get_time_summary_days(summary['months'], design)
+        return {
+            "days": [
+                {"date": date, "seconds": seconds, "sessions": count}
+                for date, (seconds, count) in sorted(days.items())
+            ],
+            "undated": {"seconds": summary['undated'][0], "sessions": summary['undated'][1]},
+            "total": summary['seconds'],
+            "sessions": summary['sessions'],
+            "lastDate": summary['last']
+        }
+    
+    def get_tracker_summary(self):
+        """get_palette_summary() from the time tracker's daily totals, for backends other than parameters."""
+        tracker = self.window.time_tracker
+        days = []
+        undated = {"seconds": 0, "sessions": 0}
+        total = 0
+        for date, totals in sorted(tracker.get_daily_totals().items(), key=lambda item: str(item[0])):
+            total += totals['duration']
+            if self.is_date(date):
+                days.append({"date": date, "seconds": totals['duration'], "sessions": totals['sessions']})
+            else:
+                undated["seconds"] += totals['duration']
+                undated["sessions"] += totals['sessions']
+        return {
+            "days": days,
+            "undated": undated,
+            "total": total,
+            "sessions": tracker.get_session_count(),
+            "lastDate": days[-1]['date'] if days else None
+        }
+    
     def handle_load_time_data(self, args):
-        """Handle loading time data."""
+        """
+        Handle loading time data: the summary (see get_palette_summary), or with
+        data {full: true} the complete time data, e.g. for exports.
+        """
         try:
             log_info("\n=== LOAD TIME DATA REQUEST ===")
             log_info("Loading time data from parameters")
             
+            try:
+                full = bool(json.loads(args.data).get('full')) if args.data else False
+            except (ValueError, AttributeError):
+                full = False
+            
             design = ParameterStorage.get_active_document()
             if not design:
                 log_error("No active document for time data load")
@@ -497,26 +546,23 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
                 })
                 return
                 
-            # Debug available parameters
-            params = design.userParameters
-            log_info(f"Found {params.count} total parameters")
-            
-            # List all parameters for debugging
-            param_names = []
-            for i in range(params.count):
-                param = params.item(i)
-                param_names.append(f"{param.name} ({param.value})")
-            log_info(f"Parameters: {', '.join(param_names)}")
+            # Debug available parameters (from the cached parameter index)
+            index = ParameterStorage.get_parameter_index(design)
+            log_info(f"Found {index.count} total parameters")
+            log_debug(f"Parameters: {', '.join(index.names())}")
             
-            # Get time parameters names
-            time_params = []
-            for i in range(params.count):
-                param = params.item(i)
-                if param.name == ParameterStorage.TIME_DATA_PARAM or param.name.startswith(ParameterStorage.TIME_PREFIX):
-                    time_params.append(param.name)
-            
-            if time_params:
-                log_info(f"Found time parameters: {', '.join(time_params)}")
+            if not full:
+                # Summary first; the palette asks for a day's sessions with loadDay
+                time_data = {"success": True, "summary": self.get_palette_summary(design)}
+                log_info(f"Sending summary of {time_data['summary']['sessions']} sessions")
+                self.send_response(args, time_data)
+                self.inject_time_data(time_data)
+            elif not self.uses_parameter_storage():
+                sessions = [session.to_dict() for session in self.window.time_tracker.get_session_history()]
+                log_info(f"Returning {len(sessions)} sessions from the {self.window.time_tracker.backend.name} backend")
+                self.send_response(args, {"timeTracker": {"version": SCHEMA_VERSION, "sessions": sessions}})
+            elif ParameterStorage.has_time_data(design):
+                log_info("Found time parameters")
                 
                 # Retrieve time data 
                 log_info("Retrieving time data from parameters")
@@ -540,13 +586,7 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
                 # Log what we're actually returning
                 session_count = len(time_data['timeTracker']['sessions'])
                 log_info(f"Returning time data with {session_count} sessions")
-                
-                # Print detailed info about the time data
-                for i, session in enumerate(time_data['timeTracker']['sessions']):
-                    log_info(f"Session {i+1}: Date: {session.get('date', 'unknown')}, Times count: {len(session.get('times', []))}")
-                    if 'times' in session and len(session['times']) > 0:
-                        log_debug(f"  First time value: {session['times'][0]} seconds")
-                
+
                 # Debug the final response
                 result_json = json.dumps(time_data)
                 log_debug(f"Sending response JSON (length: {len(result_json)})")
@@ -559,51 +599,6 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
                 success = self.send_response(args, time_data)
                 log_info(f"Parameter data sent successfully: {success}")
                 
-                # IMPORTANT: NEW APPROACH - Direct DOM manipulation as a fallback mechanism
-                # If the palette has our HTML loaded, directly set the data via DOM
-                try:
-                    log_info("Attempting direct DOM manipulation as fallback...")
-                    
-                    # Get the data as a JSON string
-                    data_json = json.dumps(time_data)
-                    
-                    # Create JavaScript code to set the hidden input's value and trigger change
-                    js_code = f"""
-                    try {{
-                        console.log("Injected time data via DOM");
-                        var dataReceiver = document.getElementById('debugDataReceiver');
-                        if (dataReceiver) {{
-                            dataReceiver.value = {json.dumps(data_json)};
-                            
-                            // Create and dispatch a change event
-                            var event = new Event('change');
-                            dataReceiver.dispatchEvent(event);
-                            
-                            // Also try direct function call
-                            if (window.receiveDirectData) {{
-                                window.receiveDirectData({json.dumps(data_json)});
-                            }}
-                            
-                            console.log("DOM data injection complete");
-                        }} else {{
-                            console.error("debugDataReceiver element not found");
-                        }}
-                    }} catch(e) {{
-                        console.error("DOM injection error:", e);
-                    }}
-                    """
-                    
-                    # Execute the JavaScript in the palette
-                    if self.window.palette:
-                        log_info("Executing DOM injection JavaScript")
-                        self.window.palette.executeScript(js_code)
-                        log_info("DOM injection complete")
-                    else:
-                        log_warning("No palette available for DOM injection")
-                except Exception as dom_err:
-                    log_warning(f"DOM manipulation fallback failed: {str(dom_err)}")
-                    # This is just a fallback, so continue even if it fails
-                    
             else:
                 log_warning("No time parameters found in document")
                 empty_data = {"timeTracker": {"sessions": []}}
@@ -619,6 +614,172 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
             self.send_response(args, empty_data)
             log_info("=== END LOAD TIME DATA REQUEST (WITH ERROR) ===\n")
     
+    def inject_time_data(self, time_data):
+        """Hand a loadTimeData response to the palette directly, in case the response does not arrive."""
+        # Direct DOM manipulation as a fallback mechanism:
+        # if the palette has our HTML loaded, directly set the data via DOM
+        try:
+            log_info("Attempting direct DOM manipulation as fallback...")
+            
+            # Get the data as a JSON string
+            data_json = json.dumps(time_data)
+            
+            # Create JavaScript code to set the hidden input's value and trigger change
+            js_code = f"""
+            try {{
+                console.log("Injected time data via DOM");
+                var dataReceiver = document.getElementById('debugDataReceiver');
+                if (dataReceiver) {{
+                    dataReceiver.value = {json.dumps(data_json)};
+                    
+                    // Create and dispatch a change event
+                    var event = new Event('change');
+                    dataReceiver.dispatchEvent(event);
+                    
+                    // Also try direct function call
+                    if (window.receiveDirectData) {{
+                        window.receiveDirectData({json.dumps(data_json)});
+                    }}
+                    
+                    console.log("DOM data injection complete");
+                }} else {{
+                    console.error("debugDataReceiver element not found");
+                }}
+            }} catch(e) {{
+                console.error("DOM injection error:", e);
+            }}
+            """
+            
+            # Execute the JavaScript in the palette
+            if self.window.palette:
+                log_info("Executing DOM injection JavaScript")
+                self.window.palette.executeScript(js_code)
+                log_info("DOM injection complete")
+            else:
+                log_warning("No palette available for DOM injection")
+        except Exception as dom_err:
+            log_warning(f"DOM manipulation fallback failed: {str(dom_err)}")
+            # This is just a fallback, so continue even if it fails
+    
+    def handle_load_day(self, args):
+        """
+        Handle loading one date's sessions: data {date: 'YYYY-MM-DD'}, selected by
+        their date like the daily totals, through the backend's range query (the
+        parameters backend reads only that month's shard). Answers with the
+        sessions and their total.
+        """
+        try:
+            request = json.loads(args.data) if args.data else {}
+            date = request.get('date') or ''
+            sessions = self.window.time_tracker.backend.query_range(date, date)
+            log_info(f"Loaded {len(sessions)} session(s) for {date}")
+            self.send_response(args, {
+                "success": True,
+                "date": date,
+                "sessions": sessions,
+                "total": sum(session.get('duration') or 0 for session in sessions)
+            })
+        except Exception as e:
+            log_error(f"Load day error: {str(e)}")
+            log_debug(f"Traceback: {traceback.format_exc()}")
+            self.send_response(args, {
+                "success": False,
+                "message": f"Error loading sessions: {str(e)}"
+            })
+    
+    def handle_add_session(self, args):
+        """
+        Handle a session finished in the palette: data {session} without an id.
+        The time tracker gives it the next id and stores it with its backend;
+        with the parameters backend that appends to the time journal, so the
+        history is not rewritten. Answers with the stored session and the new
+        totals of its date and overall.
+        """
+        try:
+            request = json.loads(args.data) if args.data else {}
+            session = request.get('session')
+            if not isinstance(session, dict) or not session.get('date'):
+                self.send_response(args, {"success": False, "message": "No session provided"})
+                return
+            
+            record = self.window.time_tracker.add_session(session)
+            if record is None:
+                self.send_response(args, {"success": False, "message": "Failed to store session"})
+                return
+            session = record.to_dict()
+            
+            if self.uses_parameter_storage():
+                design = ParameterStorage.get_active_document()
+                summary = ParameterStorage.get_time_summary(design)
+                days = ParameterStorage.get_time_summary_days([session['date'][:7]], design)
+                seconds, count = days.get(session['date'], (0, 0))
+                summary = {"total": summary['seconds'], "sessions": summary['sessions']}
+            else:
+                summary = self.get_tracker_summary()
+                day = self.window.time_tracker.get_daily_totals().get(session['date'], {"duration": 0, "sessions": 0})
+                seconds, count = day['duration'], day['sessions']
+            log_info(f"Added session {session['id']} on {session['date']}")
+            self.send_response(args, {
+                "success": True,
+                "session": session,
+                "day": {"date": session['date'], "seconds": seconds, "sessions": count},
+                "total": summary['total'],
+                "sessions": summary['sessions']
+            })
+        except Exception as e:
+            log_error(f"Add session error: {str(e)}")
+            log_debug(f"Traceback: {traceback.format_exc()}")
+            self.send_response(args, {
+                "success": False,
+                "message": f"Error adding session: {str(e)}"
+            })
+    
+    def handle_query_sessions(self, args):
+        """
+        Handle a range query: data {start, end, project} as accepted by
+        TimeTracker.query(); answers with the matching sessions and their total.
+        """
+        try:
+            request = json.loads(args.data) if args.data else {}
+            sessions = self.window.time_tracker.query(
+                request.get('start'), request.get('end'), request.get('project')
+            )
+            log_info(f"Range query returned {len(sessions)} session(s)")
+            self.send_response(args, {
+                "success": True,
+                "sessions": [session.to_dict() for session in sessions],
+                "total": sum(session.duration or 0 for session in sessions)
+            })
+        except Exception as e:
+            log_error(f"Query sessions error: {str(e)}")
+            log_debug(f"Traceback: {traceback.format_exc()}")
+            self.send_response(args, {
+                "success": False,
+                "message": f"Error querying sessions: {str(e)}"
+            })
+    
+    def handle_get_report(self, args):
+        """
+        Handle a report request: optional data {start, end, project} as for
+        querySessions; answers with every rollup of TimeTracker.get_report().
+        """
+        try:
+            request = json.loads(args.data) if args.data else {}
+            report = self.window.time_tracker.get_report(
+                request.get('start'), request.get('end'), request.get('project')
+            )
+            if report is None:
+                raise ValueError("report could not be built")
+            log_info(f"Report built from {report['sessions']} session(s)")
+            self.send_response(args, dict(report, success=True))
+        except Exception as e:
+            log_error(f"Get report error: {str(e)}")
+            log_debug(f"Traceback: {traceback.format_exc()}")
+            self.send_response(args, {
+                "success": False,
+                "message": f"Error building report: {str(e)}"
+            })
+    
     def handle_save_time_data(self, args):
         """Handle saving time data."""
         try:
@@ -648,8 +809,8 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
                 })
                 return
                 
-            # Save to parameters
-            success = ParameterStorage.store_time_data(time_data)
+            # Queue the save; saves close together are merged into one parameter write
+            success = ParameterStorage.queue_time_data(time_data)
             
             log_info(f"Save result: {'success' if success else 'FAILED'}")
             self.send_response(args, {"success": success})
@@ -827,14 +988,15 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
             
             log_info(f"Writing file: {file_path} ({len(content)} characters)")
             
-            # Write the file
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            log_info("File written successfully")
+            # The file is written on a worker thread; the palette hears back through exportProgress
+            export_id = ExportWorker.submit(
+                lambda progress: self.write_text_file(file_path, content),
+                self.window.send_export_progress, 'file write'
+            )
             self.send_response(args, {
                 "success": True,
-                "message": "File written successfully"
+                "exportId": export_id,
+                "message": "Writing file"
             })
                 
         except Exception as e:
@@ -845,6 +1007,13 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
                 "message": f"Error writing file: {str(e)}"
             })
 
+    @staticmethod
+    def write_text_file(file_path, content):
+        """Write an export file; returns its line count as the rows written."""
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return content.count('\n')
+
 class TimeTrackerWindow:
     def __init__(self, time_tracker):
         self.app = adsk.core.Application.get()
@@ -914,6 +1083,11 @@ class TimeTrackerWindow:
             if self.ui:
                 self.ui.messageBox('Failed to show window:\n{}'.format(traceback.format_exc()))
     
+    def send_export_progress(self, message):
+        """Pass an ExportWorker message on to the palette, if it is still open."""
+        if self.palette:
+            self.palette.sendInfoToHTML('exportProgress', json.dumps(message))
+    
     def get_project_info(self):
         """Get information about the current Fusion 360 project."""
         try:
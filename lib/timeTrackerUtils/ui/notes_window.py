@@ -4,6 +4,7 @@ import traceback
 import json
 import os
 from ..parameter_storage import ParameterStorage
+from ..write_behind import WriteBehindQueue
 
 class PaletteClosedHandler(adsk.core.UserInterfaceGeneralEventHandler):
     def __init__(self, window):
@@ -12,6 +13,8 @@ class PaletteClosedHandler(adsk.core.UserInterfaceGeneralEventHandler):
 
     def notify(self, args):
         try:
+            # Write anything still queued before the palette goes away
+            WriteBehindQueue.flush_idle()
             if self.window.palette:
                 self.window.palette.deleteMe()
                 self.window.palette = None
@@ -48,7 +51,7 @@ class PaletteHTMLEventHandler(adsk.core.HTMLEventHandler):
                 print("Attempting to save notes to parameters")
                 notes = data.get('notes', '')
                 print(f"Notes to save, length: {len(notes)}")
-                success = ParameterStorage.store_notes_data(notes)
+                success = ParameterStorage.queue_notes_data(notes)
                 print(f"Save notes result: {'success' if success else 'failed'}")
                 self.window.palette.sendInfoToHTML('notesSaved', json.dumps({"success": success}))
             
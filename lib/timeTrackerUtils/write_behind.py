@@ -0,0 +1,206 @@
+import adsk.core
+import hashlib
+import json
+import threading
+import traceback
+from collections import OrderedDict
+import sys
+import os
+
+# Add the lib directory to path if needed
+current_dir = os.path.dirname(os.path.abspath(__file__))
+lib_dir = os.path.abspath(os.path.join(current_dir, '..'))
+if lib_dir not in sys.path:
+    sys.path.append(lib_dir)
+
+from fusionAddInUtils import log_info, log_debug, log_warning, log_error
+
+# Local copies of writes held until the document is saved, see save_with_document
+PENDING_DIR = os.path.abspath(os.path.join(current_dir, '..', '..', 'data', 'pending'))
+
+class WriteBehindQueue:
+    """
+    Coalesces document writes that arrive close together.
+    Writes are queued per document and data name, and a newer write replaces the
+    pending one. Once no write has arrived for QUIET_PERIOD seconds a background
+    timer fires FLUSH_EVENT_ID; its handler runs flush() on Fusion's main thread,
+    since the Fusion API must not be used from other threads.
+    flush() is also called directly on palette close, document save/close and
+    add-in stop. While the queue is not enabled, writes are performed immediately.
+    
+    In save-with-document mode there is no timer and palette close does not
+    flush: writes are held until the document is saved, since parameters only
+    persist with the document anyway. Each held write is also kept as a local
+    file in PENDING_DIR; when a document is closed unsaved, the add-in stops or
+    Fusion crashes, the write is recovered from there the next time the
+    document is activated.
+    """
+
+    FLUSH_EVENT_ID = 'FusionTimekeeperFlushWrites'
+    QUIET_PERIOD = 3.0  # seconds without writes before pending writes are flushed
+
+    # Whether a flush event handler is registered, see entry.py
+    enabled = False
+    
+    # Opt-in: hold writes until the document is saved (data/settings.json "save_with_document")
+    save_with_document = False
+
+    # (doc key, name) -> (write function, arguments), oldest first
+    _pending = OrderedDict()
+    _timer = None
+    _lock = threading.Lock()
+
+    # Writes submitted, writes replaced by a newer one, and writes performed
+    stats = {'queued': 0, 'coalesced': 0, 'written': 0}
+
+    @staticmethod
+    def submit(doc_key, name, write, *args):
+        """
+        Queue write(*args) for the document, replacing any pending write with the
+        same name. Returns True when queued, or the result of write() when the
+        write had to be performed immediately.
+        """
+        if not WriteBehindQueue.enabled or not doc_key:
+            return write(*args)
+
+        key = (doc_key, name)
+        with WriteBehindQueue._lock:
+            if WriteBehindQueue._pending.pop(key, None) is not None:
+                WriteBehindQueue.stats['coalesced'] += 1
+            WriteBehindQueue._pending[key] = (write, args)
+            WriteBehindQueue.stats['queued'] += 1
+            if not WriteBehindQueue.save_with_document:
+                WriteBehindQueue._restart_timer()
+        if WriteBehindQueue.save_with_document:
+            WriteBehindQueue._save_local_copy(doc_key, name, args[0])
+        log_debug(f"Queued write of {name} ({len(WriteBehindQueue._pending)} pending)")
+        return True
+
+    @staticmethod
+    def pending(doc_key, name):
+        """Return the arguments of the pending write for the document, or None."""
+        with WriteBehindQueue._lock:
+            entry = WriteBehindQueue._pending.get((doc_key, name))
+        return entry[1] if entry else None
+
+    @staticmethod
+    def discard(doc_key, name):
+        """Drop a pending write that a direct write has made obsolete."""
+        with WriteBehindQueue._lock:
+            WriteBehindQueue._pending.pop((doc_key, name), None)
+
+    @staticmethod
+    def flush(doc_key=None):
+        """
+        Perform the pending writes for one document, or for all documents.
+        Returns False if any of the writes failed.
+        """
+        with WriteBehindQueue._lock:
+            keys = [key for key in WriteBehindQueue._pending if doc_key is None or key[0] == doc_key]
+            writes = [(key, WriteBehindQueue._pending.pop(key)) for key in keys]
+            if not WriteBehindQueue._pending and WriteBehindQueue._timer:
+                WriteBehindQueue._timer.cancel()
+                WriteBehindQueue._timer = None
+
+        if not writes:
+            return True
+        log_info(f"Flushing {len(writes)} pending write(s)")
+
+        success = True
+        for key, (write, args) in writes:
+            try:
+                if not write(*args):
+                    log_warning(f"Pending write of {key[1]} failed")
+                    success = False
+                else:
+                    WriteBehindQueue._remove_local_copy(*key)
+                WriteBehindQueue.stats['written'] += 1
+            except Exception as e:
+                log_error(f"Pending write of {key[1]} failed: {str(e)}")
+                log_debug(f"Traceback: {traceback.format_exc()}")
+                success = False
+        return success
+
+    @staticmethod
+    def release(doc_key=None):
+        """
+        Drop held writes for one document, or all documents, without writing them.
+        Their local copies are kept, so recover() finds them next time.
+        """
+        with WriteBehindQueue._lock:
+            keys = [key for key in WriteBehindQueue._pending if doc_key is None or key[0] == doc_key]
+            for key in keys:
+                del WriteBehindQueue._pending[key]
+        if keys:
+            log_info(f"Keeping {len(keys)} unsaved write(s) for recovery")
+
+    @staticmethod
+    def flush_idle():
+        """Flush for reasons other than a document save; does nothing in save-with-document mode."""
+        if WriteBehindQueue.save_with_document:
+            return True
+        return WriteBehindQueue.flush()
+
+    @staticmethod
+    def _local_copy_path(doc_key, name):
+        key_hash = hashlib.blake2b(f"{doc_key}\0{name}".encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(PENDING_DIR, key_hash + '.json')
+
+    @staticmethod
+    def _save_local_copy(doc_key, name, value):
+        """Write the held value to its local file, replacing the previous copy atomically."""
+        try:
+            os.makedirs(PENDING_DIR, exist_ok=True)
+            path = WriteBehindQueue._local_copy_path(doc_key, name)
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'doc': doc_key, 'name': name, 'value': value}, f, separators=(',', ':'))
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            log_warning(f"Could not keep local copy of {name}: {str(e)}")
+
+    @staticmethod
+    def _remove_local_copy(doc_key, name):
+        try:
+            path = WriteBehindQueue._local_copy_path(doc_key, name)
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            log_warning(f"Could not remove local copy of {name}: {str(e)}")
+
+    @staticmethod
+    def recover(doc_key):
+        """Return {name: value} of held writes for the document left over from an earlier session."""
+        recovered = {}
+        if not doc_key or not os.path.isdir(PENDING_DIR):
+            return recovered
+        for file_name in os.listdir(PENDING_DIR):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(PENDING_DIR, file_name), 'r', encoding='utf-8') as f:
+                    held = json.load(f)
+                if held.get('doc') == doc_key:
+                    recovered[held['name']] = held['value']
+            except Exception as e:
+                log_warning(f"Skipping unreadable local copy {file_name}: {str(e)}")
+        return recovered
+
+    @staticmethod
+    def _restart_timer():
+        # Called with _lock held
+        if WriteBehindQueue._timer:
+            WriteBehindQueue._timer.cancel()
+        timer = threading.Timer(WriteBehindQueue.QUIET_PERIOD, WriteBehindQueue._fire_flush_event)
+        timer.daemon = True
+        timer.start()
+        WriteBehindQueue._timer = timer
+
+    @staticmethod
+    def _fire_flush_event():
+        # Runs on the timer thread; the flush itself happens in the event handler
+        try:
+            app = adsk.core.Application.get()
+            if app:
+                app.fireCustomEvent(WriteBehindQueue.FLUSH_EVENT_ID)
+        except Exception:
+            pass
@@ -0,0 +1,193 @@
+"""
+Check that ParameterStorage writes a save's parameter changes inside a single
+deferred-compute window, so Fusion recomputes the design once per save.
+
+The adsk modules only exist inside Fusion 360; small stand-ins for the parts
+ParameterStorage uses are installed before it is imported.
+"""
+import os
+import sys
+import types
+import unittest
+
+LIB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lib')
+
+
+class FakeValueInput:
+    def __init__(self, value):
+        self.value = value
+
+    @staticmethod
+    def createByString(value):
+        return FakeValueInput(value)
+
+    @staticmethod
+    def createByReal(value):
+        return FakeValueInput(value)
+
+
+class FakeParameter:
+    def __init__(self, parameters, name, value, unit, comment):
+        self._parameters = parameters
+        self.name = name
+        self.unit = unit
+        self._comment = comment
+        self._expression = value if isinstance(value, str) else str(value)
+        self._value = 0.0 if isinstance(value, str) else float(value)
+
+    def _change(self):
+        self._parameters.design.record_change()
+
+    @property
+    def expression(self):
+        return self._expression
+
+    @expression.setter
+    def expression(self, value):
+        self._change()
+        self._expression = value
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._change()
+        self._value = value
+
+    @property
+    def comment(self):
+        return self._comment
+
+    @comment.setter
+    def comment(self, value):
+        self._change()
+        self._comment = value
+
+    def deleteMe(self):
+        self._change()
+        self._parameters.items.remove(self)
+        return True
+
+
+class FakeParameters:
+    def __init__(self, design):
+        self.design = design
+        self.items = []
+
+    @property
+    def count(self):
+        return len(self.items)
+
+    def item(self, index):
+        return self.items[index]
+
+    def itemByName(self, name):
+        for parameter in self.items:
+            if parameter.name == name:
+                return parameter
+        return None
+
+    def add(self, name, value_input, unit, comment):
+        if self.itemByName(name):
+            raise RuntimeError(f"Parameter {name} already exists")
+        self.design.record_change()
+        parameter = FakeParameter(self, name, value_input.value, unit, comment)
+        self.items.append(parameter)
+        return parameter
+
+
+class FakeDesign:
+    """
+    Counts deferred-compute windows (isComputeDeferred switched on) and the
+    parameter changes made while compute was not deferred.
+    """
+
+    def __init__(self, name):
+        self.parentDocument = types.SimpleNamespace(name=name, creationId=f'cid-{name}', dataFile=None)
+        self.userParameters = FakeParameters(self)
+        self._deferred = False
+        self.windows = 0
+        self.undeferred_changes = 0
+
+    @property
+    def isComputeDeferred(self):
+        return self._deferred
+
+    @isComputeDeferred.setter
+    def isComputeDeferred(self, value):
+        if value and not self._deferred:
+            self.windows += 1
+        self._deferred = value
+
+    def record_change(self):
+        if not self._deferred:
+            self.undeferred_changes += 1
+
+    @staticmethod
+    def cast(obj):
+        return obj
+
+
+def install_fake_adsk():
+    adsk = types.ModuleType('adsk')
+    core = types.ModuleType('adsk.core')
+    fusion = types.ModuleType('adsk.fusion')
+    core.Application = types.SimpleNamespace(get=lambda: None)
+    core.ValueInput = FakeValueInput
+    fusion.Design = FakeDesign
+    adsk.core = core
+    adsk.fusion = fusion
+    sys.modules.update({'adsk': adsk, 'adsk.core': core, 'adsk.fusion': fusion})
+
+
+install_fake_adsk()
+if LIB_DIR not in sys.path:
+    sys.path.insert(0, LIB_DIR)
+
+import fusionAddInUtils  # noqa: E402
+
+fusionAddInUtils.log_to_text_window = lambda message, level="INFO": None
+
+from timeTrackerUtils.parameter_storage import ParameterStorage  # noqa: E402
+
+
+def make_session(session_id, date):
+    return {
+        'id': session_id,
+        'date': date,
+        'start_time': f'{date}T09:00:00',
+        'end_time': f'{date}T09:01:00',
+        'duration': 60.0,
+        'project_path': 'project',
+        'notes': '',
+    }
+
+
+class DeferredComputeTest(unittest.TestCase):
+    def setUp(self):
+        ParameterStorage._stored_hashes.clear()
+        self.design = FakeDesign(self.id())
+
+    def assert_one_window(self):
+        self.assertEqual(self.design.windows, 1)
+        self.assertEqual(self.design.undeferred_changes, 0)
+        self.assertFalse(self.design.isComputeDeferred)
+
+    def test_store_time_data_defers_compute_once(self):
+        sessions = [make_session(i, f'2026-0{1 + i % 5}-1{i % 7}') for i in range(1, 60)]
+        ParameterStorage.store_time_data({'timeTracker': {'version': 2, 'sessions': sessions}}, self.design)
+        self.assertTrue(self.design.userParameters.count > 1)
+        self.assert_one_window()
+
+    def test_append_time_session_defers_compute_once(self):
+        ParameterStorage.store_time_data({'timeTracker': {'version': 2, 'sessions': [make_session(1, '2026-01-05')]}}, self.design)
+        for session_id, date in ((2, '2026-02-03'), (1, '2026-01-06')):
+            self.design.windows = 0
+            self.assertTrue(ParameterStorage.append_time_session(make_session(session_id, date), self.design))
+            self.assert_one_window()
+
+
+if __name__ == '__main__':
+    unittest.main()